@@ -0,0 +1,179 @@
+"""
+Асинхронные представления для эндпоинтов, занятых в основном вводом-выводом.
+
+Используются при запуске через ASGI (SERVER_INTERFACE=asgi): пока
+обращения к ORM и файловому хранилищу выполняются в ограниченном пуле
+потоков, цикл событий воркера продолжает обслуживать другие запросы.
+"""
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from recipes.models import Recipe
+from .serializers import SetAvatarSerializer
+from .utils import (
+    create_short_link,
+    generate_shopping_cart_csv,
+    get_shopping_list,
+)
+
+orm_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_ORM_THREADS, thread_name_prefix='orm'
+)
+
+
+def async_csrf_exempt(view):
+    """
+    Аналог csrf_exempt для асинхронных представлений: декоратор Django 3.2
+    оборачивает представление в синхронную функцию.
+    """
+    view.csrf_exempt = True
+    return view
+
+
+def _call(func, args, kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_orm(func, *args, **kwargs):
+    """Выполняет синхронный код с доступом к базе в пуле потоков."""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        orm_executor, partial(context.run, _call, func, args, kwargs)
+    )
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    """Ответ в том же формате, что и у представлений DRF."""
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    return HttpResponse(
+        renderer.render(data),
+        content_type=renderer.media_type,
+        status=status_code,
+    )
+
+
+def render_exception(exc, drf_request):
+    """Ответ на исключение DRF, как у стандартного обработчика."""
+    response = render({'detail': exc.detail}, exc.status_code)
+    if isinstance(
+        exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+    ):
+        authenticators = drf_request.authenticators
+        if authenticators:
+            response['WWW-Authenticate'] = authenticators[
+                0
+            ].authenticate_header(drf_request)
+        response.status_code = status.HTTP_401_UNAUTHORIZED
+    return response
+
+
+def _authenticate(drf_request):
+    if not drf_request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    return drf_request.user
+
+
+async def authenticate(request):
+    """
+    Аутентифицирует запрос классами из настроек DRF.
+
+    Возвращает пару (запрос DRF, ответ с ошибкой или None).
+    """
+    drf_request = Request(
+        request,
+        parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+        authenticators=[
+            auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ],
+    )
+    try:
+        await run_orm(_authenticate, drf_request)
+    except exceptions.APIException as exc:
+        return drf_request, render_exception(exc, drf_request)
+    return drf_request, None
+
+
+def _save_avatar(user, avatar):
+    # Удаляем старый аватар, если он существует. Пользователь может быть
+    # взят из кеша аутентификации, поэтому сохраняется только аватар.
+    if user.avatar:
+        user.avatar.delete(save=False)
+    user.avatar = avatar
+    user.save(update_fields=['avatar'])
+
+
+def _delete_avatar(user):
+    if user.avatar:
+        user.avatar.delete(save=False)
+        user.save(update_fields=['avatar'])
+
+
+def _validate(serializer):
+    serializer.is_valid()
+    return serializer
+
+
+@async_csrf_exempt
+async def avatar(request):
+    """Загрузка и удаление аватара пользователя."""
+    if request.method not in ('PUT', 'DELETE'):
+        return HttpResponseNotAllowed(['PUT', 'DELETE'])
+    drf_request, error = await authenticate(request)
+    if error is not None:
+        return error
+    user = drf_request.user
+
+    if request.method == 'DELETE':
+        await run_orm(_delete_avatar, user)
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+    try:
+        data = await run_orm(lambda: drf_request.data)
+    except exceptions.APIException as exc:
+        return render_exception(exc, drf_request)
+    serializer = await run_orm(_validate, SetAvatarSerializer(data=data))
+    if serializer.errors:
+        return render(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    await run_orm(_save_avatar, user, serializer.validated_data['avatar'])
+    return render({'avatar': request.build_absolute_uri(user.avatar.url)})
+
+
+@async_csrf_exempt
+async def download_shopping_cart(request):
+    """Скачивание списка покупок в формате CSV."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    drf_request, error = await authenticate(request)
+    if error is not None:
+        return error
+    shopping_cart = await run_orm(get_shopping_list, drf_request.user)
+    return generate_shopping_cart_csv(shopping_cart)
+
+
+@async_csrf_exempt
+async def get_link(request, pk):
+    """Получение прямой ссылки на рецепт."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    exists = await run_orm(Recipe.objects.filter(id=pk).exists)
+    if not exists:
+        return render(
+            {'detail': exceptions.NotFound.default_detail},
+            status.HTTP_404_NOT_FOUND,
+        )
+    return render({'short-link': create_short_link(pk, request)})
@@ -0,0 +1,76 @@
+import copy
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from foodgram.cache import LRUCache
+
+auth_cache = LRUCache(
+    settings.AUTH_CACHE_MAX_SIZE, settings.AUTH_CACHE_TIMEOUT
+)
+
+
+def invalidate_user(user_id):
+    """Удаляет из кеша все записи пользователя."""
+    auth_cache.delete_if(lambda entry: entry[0].pk == user_id)
+
+
+def invalidate_token(key):
+    """Удаляет из кеша запись токена."""
+    auth_cache.delete(f'token:{key}')
+
+
+def _copy(entry):
+    # Каждый запрос получает свою копию пользователя, чтобы изменения
+    # в одном запросе не попадали в кеш и в параллельные запросы.
+    user, auth = entry
+    return copy.copy(user), auth
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с кешем «токен -> пользователь».
+
+    Повторные запросы с тем же токеном не обращаются к базе, пока запись
+    не устареет или не будет удалена при выходе пользователя либо
+    изменении его данных (в том числе пароля).
+    """
+
+    def authenticate_credentials(self, key):
+        entry = auth_cache.get(f'token:{key}')
+        if entry is None:
+            entry = super().authenticate_credentials(key)
+            auth_cache.set(f'token:{key}', entry)
+        return _copy(entry)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Аутентификация по короткоживущему JWT access-токену.
+
+    Подпись и срок действия проверяются без обращения к базе,
+    пользователь берется из того же кеша, что и для токенов.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken(
+                'Token contained no recognizable user identification'
+            ) from exc
+
+        entry = auth_cache.get(f'user:{user_id}')
+        if entry is None:
+            entry = (super().get_user(validated_token), None)
+            auth_cache.set(f'user:{user_id}', entry)
+        user, _ = _copy(entry)
+        if not user.is_active:
+            raise AuthenticationFailed(
+                'User is inactive', code='user_inactive'
+            )
+        return user
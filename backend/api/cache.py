@@ -0,0 +1,236 @@
+"""Вспомогательные функции для работы с кешем."""
+
+import hashlib
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from . import constants
+
+LEASE_KEY = 'lease:{key}'
+ADVISORY_LOCK_SQL = 'SELECT pg_try_advisory_lock(%s)'
+ADVISORY_UNLOCK_SQL = 'SELECT pg_advisory_unlock(%s)'
+
+logger = logging.getLogger(__name__)
+
+# Ключи, пересчет которых уже идет в фоне в этом процессе
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+# Вычисления single_flight, идущие в этом процессе, по ключам
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def make_query_key(prefix, query_params, exclude=(), extra=()):
+    """
+    Ключ кеша по нормализованной строке запроса: параметры и их значения
+    сортируются, служебные параметры из exclude отбрасываются.
+    """
+    items = sorted(
+        (name, sorted(query_params.getlist(name)))
+        for name in query_params
+        if name not in exclude
+    )
+    digest = hashlib.md5(
+        repr((items, tuple(extra))).encode(), usedforsecurity=False
+    ).hexdigest()
+    return f'{prefix}:{digest}'
+
+
+def lease_lock_id(key):
+    """Номер рекомендательной блокировки PostgreSQL (bigint) для ключа."""
+    digest = hashlib.blake2b(
+        LEASE_KEY.format(key=key).encode(), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def acquire_lease(key, lease=constants.SINGLE_FLIGHT_LEASE):
+    """
+    Захватывает аренду вычисления key. Возвращает маркер владельца или
+    None, если аренду держит другой процесс.
+
+    Захват должен быть атомарным для всех воркеров и контейнеров, поэтому
+    способ задается настройкой LEASE_BACKEND:
+
+    postgres — сессионная рекомендательная блокировка на соединении
+    потока с основной базой. Она снимается и при обрыве соединения
+    упавшего воркера, поэтому lease не используется;
+    cache — add() общего кеша на lease секунд. Атомарен у memcached и
+    Redis, но не у FileBasedCache и LocMemCache: с ними аренду могут
+    одновременно получить несколько воркеров.
+
+    Освобождать аренду нужно в том же потоке, который ее захватил.
+    """
+    if settings.LEASE_BACKEND == 'postgres':
+        lock_id = lease_lock_id(key)
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute(ADVISORY_LOCK_SQL, [lock_id])
+            acquired = cursor.fetchone()[0]
+        return lock_id if acquired else None
+    token = uuid.uuid4().hex
+    if cache.add(LEASE_KEY.format(key=key), token, lease):
+        return token
+    return None
+
+
+def release_lease(key, token):
+    """Освобождает аренду, если она еще принадлежит владельцу."""
+    if settings.LEASE_BACKEND == 'postgres':
+        release_advisory_lock(token)
+        return
+    lease_key = LEASE_KEY.format(key=key)
+    if cache.get(lease_key) == token:
+        cache.delete(lease_key)
+
+
+def release_advisory_lock(lock_id):
+    connection = connections[DEFAULT_DB_ALIAS]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(ADVISORY_UNLOCK_SQL, [lock_id])
+    except DatabaseError:
+        logger.exception('Не удалось снять блокировку %s', lock_id)
+        # Сессионная блокировка живет, пока открыто соединение, а пул
+        # вернул бы его другим потокам вместе с ней. Внутри транзакции
+        # соединение закрыть нельзя: блокировку снимет закрытие
+        # соединения пулом по MAX_LIFETIME.
+        if not connection.in_atomic_block and connection.connection:
+            connection.connection.close()
+            connection.close()
+
+
+class Flight:
+    """Вычисление single_flight, результата которого ждут другие потоки."""
+
+    __slots__ = ('done', 'value', 'failed')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+def single_flight(key, compute, lookup=None):
+    """
+    Выполняет compute() для ключа одновременно не более одного раза.
+
+    Потоки процесса с тем же ключом ждут результата первого. Между
+    воркерами вычисляющий держит ключ блокировки с короткой арендой;
+    остальные до SINGLE_FLIGHT_WAIT секунд опрашивают lookup() (обычно —
+    чтение кеша, куда compute() кладет результат) и только потом
+    вычисляют сами.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = Flight()
+    if not leader:
+        flight.done.wait(constants.SINGLE_FLIGHT_WAIT)
+        if flight.done.is_set() and not flight.failed:
+            return flight.value
+        return compute()
+    try:
+        flight.value = _compute_once(key, compute, lookup)
+        return flight.value
+    except BaseException:
+        flight.failed = True
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def _compute_once(key, compute, lookup):
+    token = acquire_lease(key)
+    if token is not None:
+        try:
+            return compute()
+        finally:
+            release_lease(key, token)
+    if lookup is not None:
+        deadline = time.monotonic() + constants.SINGLE_FLIGHT_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(constants.SINGLE_FLIGHT_POLL_INTERVAL)
+            value = lookup()
+            if value is not None:
+                return value
+    return compute()
+
+
+def get_or_compute(key, compute, timeout):
+    """Значение из кеша или compute(), вычисленное одним запросом."""
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    def refresh():
+        value = compute()
+        cache.set(key, value, timeout)
+        return value
+
+    return single_flight(key, refresh, lambda: cache.get(key))
+
+
+def revalidate_in_background(key, refresh):
+    """
+    Запускает refresh() в фоновом потоке: не более одного на ключ в
+    процессе и только если ключ не обновляет другой воркер.
+    """
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+
+    def run():
+        token = acquire_lease(key)
+        try:
+            if token is not None:
+                refresh()
+        except Exception:
+            logger.exception('Не удалось обновить запись кеша %s', key)
+        finally:
+            if token is not None:
+                release_lease(key, token)
+            with _revalidating_lock:
+                _revalidating.discard(key)
+            connections.close_all()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def get_or_revalidate(key, generation, compute, timeout, stale_timeout):
+    """
+    Значение compute() из кеша с отдачей устаревшего при обновлении.
+
+    Запись свежая timeout секунд и пока поколение не изменилось. После
+    этого она еще до stale_timeout секунд отдается как есть, а новое
+    значение вычисляется в фоне. Без записи compute() выполняется сразу,
+    одним запросом на все одновременные промахи.
+    """
+
+    def refresh():
+        value = compute()
+        entry = (generation, time.time() + timeout, value)
+        cache.set(key, entry, stale_timeout)
+        return value
+
+    def lookup():
+        entry = cache.get(key)
+        return None if entry is None else entry[2]
+
+    entry = cache.get(key)
+    if entry is None:
+        return single_flight(key, refresh, lookup)
+    entry_generation, fresh_until, value = entry
+    if entry_generation != generation or fresh_until <= time.time():
+        revalidate_in_background(key, refresh)
+    return value
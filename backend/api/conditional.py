@@ -0,0 +1,39 @@
+"""
+Условные GET-запросы: ETag, Last-Modified и заголовки кеширования.
+
+Валидаторы вычисляются по отметкам изменений в базе (Recipe.updated_at,
+версии справочников), без сериализации тела ответа.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+
+def make_etag(*parts):
+    """Слабый ETag по значениям, от которых зависит тело ответа."""
+    digest = hashlib.md5(
+        repr(parts).encode(), usedforsecurity=False
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def latest(*values):
+    """Наибольшая из дат, пропуская None."""
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def patch_cache_headers(request, response):
+    """
+    Анонимные ответы можно кешировать публично (в том числе nginx),
+    ответы пользователю — только в его клиенте с перепроверкой.
+    """
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.ANONYMOUS_CACHE_MAX_AGE
+        )
+    patch_vary_headers(response, ('Accept', 'Authorization'))
@@ -37,6 +37,27 @@ NO_INGREDIENTS_ERROR = 'Необходимо указать хотя бы оди
 DUPLICATE_INGREDIENTS_ERROR = 'Ингредиент указан более одного раза.'
 INGREDIENT_NOT_EXIST_ERROR = 'Ингредиент не существует.'
 
+# Подбор рецептов по ингредиентам в кладовой
+MAX_PANTRY_MISSING = 2
+
+# Минимальный коэффициент Жаккара для похожих рецептов
+MIN_RECIPE_SIMILARITY = 0.2
+
+# Фасеты списка рецептов
+FACET_TAGS = 'tags'
+FACET_COOKING_TIME = 'cooking_time'
+FACET_AUTHOR = 'author'
+FACETS = (FACET_TAGS, FACET_COOKING_TIME, FACET_AUTHOR)
+FACETS_CACHE_TIMEOUT = 60
+# Интервалы времени приготовления: (название, от, до включительно)
+COOKING_TIME_BUCKETS = (
+    ('0-15', MIN_COOKING_TIME, 15),
+    ('16-30', 16, 30),
+    ('31-60', 31, 60),
+    ('60+', 61, MAX_COOKING_TIME),
+)
+UNKNOWN_FACET_ERROR = 'Неизвестный фасет: {name}. Допустимые: {choices}.'
+
 # Сообщения об ошибках для тегов
 TAG_NOT_EXISTS = 'Тег с идентификатором {pk_value} не существует'
 TAG_INCORRECT_TYPE = 'Некорректный тип данных. Ожидался ID тега'
@@ -58,3 +79,67 @@ ERROR_ALREADY_SUBSCRIBED = 'Вы уже подписаны на этого ав
 
 # Общие сообщения
 EMPTY = '---'
+
+# Выборочные поля ответа (?fields=, ?expand=)
+RECIPE_FIELDS = (
+    'id',
+    'tags',
+    'author',
+    'ingredients',
+    'is_favorited',
+    'is_in_shopping_cart',
+    'name',
+    'image',
+    'text',
+    'cooking_time',
+)
+RECIPE_EXPANDABLE_FIELDS = ('tags', 'author', 'ingredients')
+USER_FIELDS = (
+    'email',
+    'id',
+    'username',
+    'first_name',
+    'last_name',
+    'is_subscribed',
+    'avatar',
+)
+UNKNOWN_FIELD_ERROR = 'Неизвестное поле: {name}. Допустимые: {choices}.'
+
+# Кеш публичных фрагментов рецептов
+RECIPE_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+# Запоминание отсутствующих рецептов
+MISSING_RECIPE_CACHE_TIMEOUT = 30
+
+# Кеш страниц списка рецептов для анонимных пользователей: сколько
+# страница свежая и сколько еще отдается, пока обновляется в фоне
+RECIPE_LIST_CACHE_TIMEOUT = 30
+RECIPE_LIST_STALE_TIMEOUT = 10 * 60
+
+# Однократное вычисление при промахах кеша (single-flight): срок аренды
+# ключа блокировки, ожидание чужого результата и интервал опроса, сек.
+SINGLE_FLIGHT_LEASE = 10
+SINGLE_FLIGHT_WAIT = 3
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+
+# Кеш ответов справочника ингредиентов (ключ включает версию)
+INGREDIENTS_CACHE_TIMEOUT = 60 * 60
+# Кеш списка покупок пользователя
+SHOPPING_LIST_CACHE_TIMEOUT = 5 * 60
+# Число документов рецептов, перестраиваемых за один запрос
+DOCUMENT_BATCH_SIZE = 500
+# Наибольшее число id из битовых карт тегов в фильтре id IN (...);
+# для более популярных тегов фильтр идет через EXISTS.
+TAG_FILTER_MAX_IDS = 500
+
+# Число объектов в ответах с пагинацией: ?count=exact требует точного
+# подсчета. Полные списки больших таблиц (от COUNT_ESTIMATE_THRESHOLD
+# строк) берут оценку из статистики PostgreSQL, остальные подсчеты
+# кешируются: полные — до изменения данных, с фильтрами — на
+# FILTERED_COUNT_CACHE_TIMEOUT секунд.
+COUNT_PARAM = 'count'
+EXACT_COUNT = 'exact'
+COUNT_ESTIMATE_THRESHOLD = 100_000
+TOTAL_COUNT_CACHE_TIMEOUT = 60 * 60
+FILTERED_COUNT_CACHE_TIMEOUT = 30
+# Пространства имен кеша, версии которых меняются вместе с таблицами
+COUNT_NAMESPACES = {'recipe': 'recipes', 'user': 'users'}
@@ -0,0 +1,69 @@
+"""
+Число объектов для ответов с пагинацией без COUNT(*) на каждый запрос.
+
+Точный подсчет выполняется при ?count=exact. Полный список большой
+таблицы получает оценку reltuples из каталога PostgreSQL, небольшой —
+точное число, закешированное до смены поколения пространства имен.
+Подсчеты с фильтрами кешируются по нормализованной строке запроса и
+пользователю на короткое время.
+"""
+
+from django.db import connections
+
+from foodgram.cache import get_generation, lists_namespace
+from . import constants
+from .cache import get_or_compute, make_query_key
+
+TOTAL_COUNT_KEY = 'count:{label}'
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк таблицы из статистики PostgreSQL или None, если
+    она недоступна или таблица небольшая.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(queryset.model._meta.db_table)],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < constants.COUNT_ESTIMATE_THRESHOLD:
+        return None
+    return row[0]
+
+
+def count_objects(request, queryset, exclude=()):
+    """
+    Число объектов queryset по стратегии из описания модуля; exclude —
+    параметры пагинации, которые не влияют на число.
+    """
+    if request.query_params.get(constants.COUNT_PARAM) == (
+        constants.EXACT_COUNT
+    ):
+        return queryset.count()
+    meta = queryset.model._meta
+    namespace = constants.COUNT_NAMESPACES.get(meta.model_name)
+    generation = get_generation(namespace) if namespace else None
+    if not queryset.query.where:
+        estimate = estimate_count(queryset)
+        if estimate is not None:
+            return estimate
+        key = TOTAL_COUNT_KEY.format(label=meta.label_lower)
+        timeout = constants.TOTAL_COUNT_CACHE_TIMEOUT
+    else:
+        extra = [request.path, request.user.pk]
+        if request.user.is_authenticated:
+            # Фильтры по избранному и списку покупок
+            extra.append(get_generation(lists_namespace(request.user.pk)))
+        key = make_query_key(
+            'count',
+            request.query_params,
+            exclude=(*exclude, constants.COUNT_PARAM),
+            extra=extra,
+        )
+        timeout = constants.FILTERED_COUNT_CACHE_TIMEOUT
+    return get_or_compute(f'{key}:{generation}', queryset.count, timeout)
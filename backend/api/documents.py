@@ -0,0 +1,160 @@
+"""
+Материализованные представления рецептов в столбце Recipe.document.
+
+Документ — публичный фрагмент рецепта (см. fragments): без флагов
+пользователя и с относительными ссылками на файлы. Он перестраивается в
+той же транзакции, что и изменение рецепта, его ингредиентов, тегов или
+профиля автора, поэтому чтение рецептов сводится к одной таблице и
+флагам пользователя.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from recipes.models import Recipe
+from . import constants
+from .projections import RecipeProjection
+
+# jsonb в PostgreSQL не сохраняет порядок ключей, поэтому он
+# восстанавливается при чтении.
+AUTHOR_KEYS = (
+    'email',
+    'id',
+    'username',
+    'first_name',
+    'last_name',
+    'is_subscribed',
+    'avatar',
+)
+TAG_KEYS = ('id', 'name', 'slug')
+INGREDIENT_KEYS = ('id', 'name', 'measurement_unit', 'amount')
+
+_deferred = threading.local()
+
+
+def ordered(data, keys):
+    return {key: data[key] for key in keys}
+
+
+def load_document(document):
+    """Документ из базы с порядком ключей RecipeReadSerializer."""
+    data = ordered(document, constants.RECIPE_FIELDS)
+    data['author'] = ordered(document['author'], AUTHOR_KEYS)
+    data['tags'] = [ordered(tag, TAG_KEYS) for tag in document['tags']]
+    data['ingredients'] = [
+        ordered(ingredient, INGREDIENT_KEYS)
+        for ingredient in document['ingredients']
+    ]
+    return data
+
+
+def build_documents(recipe_ids):
+    """Документы рецептов {id: документ}, собранные по связанным таблицам."""
+    projection = RecipeProjection(None, public=True)
+    values = projection.values(Recipe.objects.filter(id__in=recipe_ids))
+    return {data['id']: data for data in projection.serialize(values)}
+
+
+def get_documents(recipe_ids, using=None):
+    """Сохраненные документы рецептов {id: документ}."""
+    rows = (
+        Recipe.objects.using(using)
+        .filter(id__in=recipe_ids, document__isnull=False)
+        .order_by()
+        .values_list('id', 'document')
+    )
+    return {recipe_id: load_document(document) for recipe_id, document in rows}
+
+
+def rebuild_documents(recipe_ids, batch_size=constants.DOCUMENT_BATCH_SIZE):
+    """Перестраивает и сохраняет документы рецептов пачками."""
+    recipe_ids = sorted(set(recipe_ids))
+    rebuilt = 0
+    for start in range(0, len(recipe_ids), batch_size):
+        documents = build_documents(recipe_ids[start:start + batch_size])
+        Recipe.objects.bulk_update(
+            [
+                Recipe(id=recipe_id, document=document)
+                for recipe_id, document in documents.items()
+            ],
+            ['document'],
+        )
+        rebuilt += len(documents)
+    return rebuilt
+
+
+def forget_deleting():
+    _deferred.deleting = None
+
+
+def deleting_recipes(using=DEFAULT_DB_ALIAS):
+    """
+    Рецепты, удаляемые в текущей транзакции, или None. Множество живет до
+    ее фиксации, после отката оно не действует.
+    """
+    deleting = getattr(_deferred, 'deleting', None)
+    if deleting is not None and any(
+        entry[1] is forget_deleting
+        for entry in connections[using].run_on_commit
+    ):
+        return deleting
+    return None
+
+
+def start_deleting(recipe_id, using=DEFAULT_DB_ALIAS):
+    """
+    Отмечает удаляемый рецепт: пока каскадом удаляются строки его
+    ингредиентов, документ для него не перестраивается.
+    """
+    deleting = deleting_recipes(using)
+    if deleting is None:
+        deleting = _deferred.deleting = set()
+        transaction.on_commit(forget_deleting, using=using)
+    deleting.add(recipe_id)
+
+
+def finish_deleting(recipe_id, using=DEFAULT_DB_ALIAS):
+    deleting = deleting_recipes(using)
+    if deleting is not None:
+        deleting.discard(recipe_id)
+
+
+def schedule_documents(recipe_ids):
+    """
+    Перестраивает документы сразу или, внутри deferred_documents(), при
+    выходе из блока. Удаляемые рецепты пропускаются.
+    """
+    deleting = deleting_recipes()
+    if deleting:
+        recipe_ids = [
+            recipe_id for recipe_id in recipe_ids if recipe_id not in deleting
+        ]
+        if not recipe_ids:
+            return
+    pending = getattr(_deferred, 'recipe_ids', None)
+    if pending is None:
+        rebuild_documents(recipe_ids)
+    else:
+        pending.update(recipe_ids)
+
+
+@contextmanager
+def deferred_documents():
+    """
+    Собирает рецепты, измененные в блоке, и перестраивает их документы
+    один раз при выходе из него — в той же транзакции. Возвращает
+    множество id, в которое можно добавить рецепты явно.
+    """
+    pending = getattr(_deferred, 'recipe_ids', None)
+    if pending is not None:
+        yield pending
+        return
+    pending = _deferred.recipe_ids = set()
+    try:
+        yield pending
+    finally:
+        _deferred.recipe_ids = None
+    if pending:
+        rebuild_documents(pending)
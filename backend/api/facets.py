@@ -0,0 +1,113 @@
+from django.core.cache import cache
+from django.db.models import Count, Q
+from rest_framework.exceptions import ValidationError
+
+from foodgram.cache import get_generation, lists_namespace
+from recipes.indexes import tag_index
+from recipes.models import Recipe, Tag
+from . import constants
+from .cache import make_query_key
+
+# Параметры, от которых фасеты не зависят
+NON_FILTER_PARAMS = ('page', 'limit', 'facets', 'fields', 'expand')
+# Фильтры, результат которых зависит от пользователя
+PERSONAL_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def parse_facets(value):
+    """Разбирает параметр ?facets=tags,cooking_time,author."""
+    names = []
+    for name in value.split(','):
+        name = name.strip()
+        if not name or name in names:
+            continue
+        if name not in constants.FACETS:
+            raise ValidationError(
+                {
+                    'facets': constants.UNKNOWN_FACET_ERROR.format(
+                        name=name, choices=', '.join(constants.FACETS)
+                    )
+                }
+            )
+        names.append(name)
+    return names
+
+
+def ids_to_bitmap(ids):
+    """Собирает битовую карту из id рецептов."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    buffer = bytearray(max(ids) // 8 + 1)
+    for recipe_id in ids:
+        buffer[recipe_id >> 3] |= 1 << (recipe_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def tag_facet(queryset):
+    """Количество рецептов по каждому тегу."""
+    if tag_index.is_built:
+        selected = ids_to_bitmap(queryset.values_list('id', flat=True))
+        return {
+            slug: bin(selected & tag_index.bitmap([slug])).count('1')
+            for slug in Tag.objects.values_list('slug', flat=True)
+        }
+    rows = (
+        Recipe.tags.through.objects.filter(recipe__in=queryset)
+        .values('tag__slug')
+        .annotate(count=Count('recipe_id'))
+        .order_by()
+    )
+    counts = dict.fromkeys(Tag.objects.values_list('slug', flat=True), 0)
+    counts.update((row['tag__slug'], row['count']) for row in rows)
+    return counts
+
+
+def cooking_time_facet(queryset):
+    """Количество рецептов по интервалам времени приготовления."""
+    return queryset.aggregate(
+        **{
+            name: Count(
+                'id', filter=Q(cooking_time__gte=low, cooking_time__lte=high)
+            )
+            for name, low, high in constants.COOKING_TIME_BUCKETS
+        }
+    )
+
+
+def author_facet(queryset):
+    """Количество рецептов по авторам."""
+    rows = queryset.values('author').annotate(count=Count('id')).order_by()
+    return {row['author']: row['count'] for row in rows}
+
+
+FACET_BUILDERS = {
+    constants.FACET_TAGS: tag_facet,
+    constants.FACET_COOKING_TIME: cooking_time_facet,
+    constants.FACET_AUTHOR: author_facet,
+}
+
+
+def get_facets(request, queryset, names):
+    """
+    Счетчики фасетов для отфильтрованного списка рецептов.
+
+    Результат кешируется по нормализованному набору фильтров и поколению
+    рецептов, которое увеличивается при любом изменении каталога, а с
+    личными фильтрами — еще по поколению списков пользователя.
+    """
+    extra = [get_generation('recipes'), sorted(names)]
+    if any(name in request.query_params for name in PERSONAL_FILTERS):
+        extra += [
+            request.user.id,
+            get_generation(lists_namespace(request.user.id)),
+        ]
+    key = make_query_key(
+        'facets', request.query_params, NON_FILTER_PARAMS, extra
+    )
+    facets = cache.get(key)
+    if facets is None:
+        selected = Recipe.objects.filter(id__in=queryset.values('id'))
+        facets = {name: FACET_BUILDERS[name](selected) for name in names}
+        cache.set(key, facets, constants.FACETS_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,56 @@
+"""
+Выборочные поля ответа: ?fields= и ?expand=.
+
+Без ?fields= и ?expand= ответ не меняется: выводятся все поля, вложенные
+объекты раскрыты. С ?fields= выводятся только перечисленные поля, без
+него — все. Если передан ?expand=, раскрываются только указанные в нем
+вложенные объекты, от остальных выводятся только id.
+"""
+
+from rest_framework.exceptions import ValidationError
+
+from . import constants
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_names(param, value, choices):
+    """Разбирает список имен через запятую, проверяя допустимость."""
+    names = set()
+    for name in value.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in choices:
+            raise ValidationError(
+                {
+                    param: constants.UNKNOWN_FIELD_ERROR.format(
+                        name=name, choices=', '.join(choices)
+                    )
+                }
+            )
+        names.add(name)
+    return names
+
+
+def parse_fieldset(query_params, allowed, expandable=()):
+    """
+    Возвращает (fields, expand): поля в порядке allowed и множество
+    раскрываемых вложенных полей. У ответов без вложенных объектов
+    ?expand= не учитывается.
+    """
+    fields = parse_names(
+        FIELDS_PARAM, query_params.get(FIELDS_PARAM, ''), allowed
+    )
+    if expandable and EXPAND_PARAM in query_params:
+        expand = parse_names(
+            EXPAND_PARAM, query_params[EXPAND_PARAM], expandable
+        )
+    elif fields:
+        expand = set()
+    else:
+        expand = set(expandable)
+    if not fields:
+        return tuple(allowed), expand
+    return tuple(name for name in allowed if name in fields), expand
@@ -1,9 +1,12 @@
 from django.core.exceptions import ValidationError
+from django.db.models import Exists, OuterRef
 from django.forms import MultipleChoiceField
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe
+from recipes.indexes import TAGS_MODE_ALL, TAGS_MODE_ANY, tag_index
+from recipes.models import Ingredient, Recipe, RecipeIngredient
 from users.models import User
+from . import constants
 
 
 class TagsMultipleChoiceField(MultipleChoiceField):
@@ -25,7 +28,7 @@ class TagsMultipleChoiceField(MultipleChoiceField):
                 )
 
 
-class TagsFilter(MultipleChoiceField):
+class TagsFilter(filters.MultipleChoiceFilter):
     """
     Класс фильтра для обработки множественных значений тегов.
     """
@@ -53,12 +56,28 @@ class RecipeFilter(filters.FilterSet):
     Фильтры для рецептов.
     """
 
-    tags = filters.AllValuesMultipleFilter(
-        field_name='tags__slug', help_text='Фильтрация по тегам'
+    tags = TagsFilter(method='filter_tags', help_text='Фильтрация по тегам')
+    tags_mode = filters.ChoiceFilter(
+        choices=(
+            (TAGS_MODE_ANY, 'Любой из тегов'),
+            (TAGS_MODE_ALL, 'Все теги'),
+        ),
+        method='filter_tags_mode',
+        help_text='Режим фильтрации по нескольким тегам',
     )
     author = filters.ModelChoiceFilter(
         queryset=User.objects.all(), help_text='Фильтрация по автору'
     )
+    ingredients = filters.ModelMultipleChoiceFilter(
+        queryset=Ingredient.objects.all(),
+        method='filter_ingredients',
+        help_text='Рецепты, содержащие все указанные ингредиенты',
+    )
+    exclude_ingredients = filters.ModelMultipleChoiceFilter(
+        queryset=Ingredient.objects.all(),
+        method='filter_exclude_ingredients',
+        help_text='Рецепты без указанных ингредиентов',
+    )
     is_in_shopping_cart = filters.BooleanFilter(
         label='В корзине',
         method='filter_is_in_shopping_cart',
@@ -72,7 +91,69 @@ class RecipeFilter(filters.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ['is_favorited', 'is_in_shopping_cart', 'author', 'tags']
+        fields = [
+            'is_favorited',
+            'is_in_shopping_cart',
+            'author',
+            'tags',
+            'tags_mode',
+            'ingredients',
+            'exclude_ingredients',
+        ]
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Полусоединение EXISTS с таблицей связей рецептов и тегов: строки
+        не размножаются и DISTINCT не нужен. Для редких тегов (не больше
+        TAG_FILTER_MAX_IDS рецептов) id берутся из построенных битовых
+        карт, и запрос идет по первичному ключу.
+        """
+        if not value:
+            return queryset
+        mode = self.form.cleaned_data.get('tags_mode') or TAGS_MODE_ANY
+        recipe_ids = tag_index.few_recipe_ids(
+            value, mode, constants.TAG_FILTER_MAX_IDS
+        )
+        if recipe_ids is not None:
+            return queryset.filter(id__in=recipe_ids)
+        tags = Recipe.tags.through.objects.filter(recipe_id=OuterRef('pk'))
+        if mode != TAGS_MODE_ALL:
+            return queryset.filter(Exists(tags.filter(tag__slug__in=value)))
+        for slug in set(value):
+            queryset = queryset.filter(Exists(tags.filter(tag__slug=slug)))
+        return queryset
+
+    def filter_tags_mode(self, queryset, name, value):
+        """Режим применяется в filter_tags."""
+        return queryset
+
+    def filter_ingredients(self, queryset, name, value):
+        """
+        Полусоединение EXISTS на каждый ингредиент: рецепт должен содержать
+        их все, при этом строки рецептов не размножаются и DISTINCT
+        не нужен.
+        """
+        for ingredient in value:
+            queryset = queryset.filter(
+                Exists(
+                    RecipeIngredient.objects.filter(
+                        recipe=OuterRef('pk'), ingredient=ingredient
+                    )
+                )
+            )
+        return queryset
+
+    def filter_exclude_ingredients(self, queryset, name, value):
+        """Антисоединение NOT EXISTS по исключаемым ингредиентам."""
+        if not value:
+            return queryset
+        return queryset.filter(
+            ~Exists(
+                RecipeIngredient.objects.filter(
+                    recipe=OuterRef('pk'), ingredient__in=value
+                )
+            )
+        )
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -0,0 +1,144 @@
+"""
+Кеш публичных фрагментов рецептов.
+
+Фрагмент — представление рецепта без флагов текущего пользователя
+(is_favorited, is_in_shopping_cart, author.is_subscribed) и с
+относительными ссылками на файлы. Он хранится по id рецепта вместе с
+версией: датой изменения рецепта и версиями справочников. Флаги и
+абсолютные ссылки подставляются при каждом ответе.
+"""
+
+import hashlib
+import threading
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from . import constants
+
+FRAGMENT_KEY = 'recipe:fragment:{recipe_id}'
+FRAGMENTS_FLIGHT_KEY = 'recipe:fragments:{digest}'
+# Значение для отсутствующего рецепта
+MISSING = 'missing'
+
+# Рецепты, фрагменты которых сбрасываются после фиксации транзакции
+_pending = threading.local()
+
+
+def fragment_key(recipe_id):
+    return FRAGMENT_KEY.format(recipe_id=recipe_id)
+
+
+def fragment_version(updated_at, versions):
+    """Версия фрагмента: дата изменения рецепта и версии справочников."""
+    return (updated_at, *(version for version, _ in versions.values()))
+
+
+def get_fragments(rows, versions):
+    """
+    Актуальные фрагменты для строк (id, updated_at, ...): {id: фрагмент}.
+    """
+    keys = {fragment_key(row[0]): row for row in rows}
+    fragments = {}
+    for key, entry in cache.get_many(keys).items():
+        if entry == MISSING:
+            continue
+        version, data = entry
+        row = keys[key]
+        if version == fragment_version(row[1], versions):
+            fragments[row[0]] = data
+    return fragments
+
+
+def lookup_fragments(rows, versions):
+    """Фрагменты для всех строк или None, если хотя бы одного нет."""
+    fragments = get_fragments(rows, versions)
+    return fragments if len(fragments) == len(rows) else None
+
+
+def fragments_flight_key(recipe_ids):
+    """Ключ однократного построения фрагментов для набора рецептов."""
+    if len(recipe_ids) == 1:
+        return fragment_key(recipe_ids[0])
+    digest = hashlib.md5(
+        repr(sorted(recipe_ids)).encode(), usedforsecurity=False
+    ).hexdigest()
+    return FRAGMENTS_FLIGHT_KEY.format(digest=digest)
+
+
+def set_fragments(rows, versions, fragments):
+    """Сохраняет фрагменты {id: данные} с версиями из строк."""
+    updated = {row[0]: row[1] for row in rows}
+    cache.set_many(
+        {
+            fragment_key(recipe_id): (
+                fragment_version(updated[recipe_id], versions),
+                data,
+            )
+            for recipe_id, data in fragments.items()
+        },
+        constants.RECIPE_FRAGMENT_CACHE_TIMEOUT,
+    )
+
+
+def is_missing(recipe_id):
+    """Рецепт недавно не был найден."""
+    return cache.get(fragment_key(recipe_id)) == MISSING
+
+
+def mark_missing(recipe_id):
+    cache.set(
+        fragment_key(recipe_id),
+        MISSING,
+        constants.MISSING_RECIPE_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_fragments(recipe_ids):
+    """Удаляет фрагменты рецептов, в том числе отметки отсутствия."""
+    cache.delete_many([fragment_key(recipe_id) for recipe_id in recipe_ids])
+
+
+def flush_invalidation():
+    recipe_ids = getattr(_pending, 'recipe_ids', None)
+    _pending.recipe_ids = None
+    if recipe_ids:
+        invalidate_fragments(recipe_ids)
+
+
+def schedule_invalidation(recipe_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Сбрасывает фрагменты рецептов после фиксации транзакции, одним
+    запросом к кешу на все рецепты, измененные в ней.
+    """
+    connection = connections[using]
+    if not connection.in_atomic_block:
+        invalidate_fragments(recipe_ids)
+        return
+    pending = getattr(_pending, 'recipe_ids', None)
+    # После отката транзакции отложенный сброс отменяется, а накопленные
+    # рецепты не должны переходить в следующую транзакцию.
+    scheduled = pending is not None and any(
+        entry[1] is flush_invalidation for entry in connection.run_on_commit
+    )
+    if not scheduled:
+        pending = _pending.recipe_ids = set()
+        transaction.on_commit(flush_invalidation, using=using)
+    pending.update(recipe_ids)
+
+
+def personalize(request, fragment, is_favorited, in_cart, is_subscribed):
+    """
+    Представление рецепта для текущего запроса: флаги пользователя и
+    абсолютные ссылки на файлы поверх публичного фрагмента.
+    """
+    data = dict(fragment)
+    data['author'] = author = dict(fragment['author'])
+    author['is_subscribed'] = bool(is_subscribed)
+    if author['avatar']:
+        author['avatar'] = request.build_absolute_uri(author['avatar'])
+    data['is_favorited'] = bool(is_favorited)
+    data['is_in_shopping_cart'] = bool(in_cart)
+    if data['image']:
+        data['image'] = request.build_absolute_uri(data['image'])
+    return data
@@ -0,0 +1,362 @@
+"""
+Шина сброса кешей между процессами.
+
+Каждый воркер держит в памяти индексы тегов и ингредиентов, LSH-индекс
+похожих рецептов, кеш аутентификации и L1 двухуровневого кеша. Сигналы
+моделей публикуют события после фиксации транзакции, а слушатель в каждом
+воркере применяет события других процессов не позже чем через
+INVALIDATION_POLL_INTERVAL секунд. События, отправленные до подключения
+слушателя (в том числе до запуска воркера), не доставляются, поэтому
+после каждого подключения кеши процесса сбрасываются целиком.
+
+Транспорт задается настройкой INVALIDATION_BUS:
+    postgres — NOTIFY/LISTEN в PostgreSQL;
+    database — таблица событий, которую воркеры опрашивают;
+    local — без рассылки, для единственного процесса.
+"""
+
+import json
+import logging
+import os
+import select
+import socket
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db import close_old_connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from foodgram.cache import NAMESPACE_KEY, lists_namespace
+from recipes.indexes import (
+    ingredient_index,
+    recent_index,
+    similarity_index,
+    tag_index,
+)
+from .authentication import auth_cache, invalidate_user
+from .fragments import fragment_key
+
+RECIPES = 'recipes'
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+USERS = 'users'
+# Избранное и списки покупок, id в событиях — пользователи
+LISTS = 'lists'
+
+# Если id в событии больше, получатели сбрасывают кеши целиком:
+# размер сообщения NOTIFY ограничен 8000 байт.
+MAX_EVENT_IDS = 500
+# Пауза перед повторным подключением слушателя, сек.
+RETRY_INTERVAL = 5
+
+logger = logging.getLogger(__name__)
+
+# События текущей транзакции потока: {вид: множество id или None}
+_pending = threading.local()
+
+_transport = None
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def sender_id():
+    # pid берется при каждом вызове: модуль загружается в мастере
+    # gunicorn до fork воркеров.
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class PostgresTransport:
+    """NOTIFY при публикации, LISTEN на отдельном соединении."""
+
+    def __init__(self, channel, interval):
+        self.channel = channel
+        self.interval = interval
+
+    def send(self, payload):
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)', [self.channel, payload]
+            )
+
+    def listen(self, receive, stopped, ready):
+        import psycopg2
+        from psycopg2.extensions import quote_ident
+
+        connection = psycopg2.connect(
+            **connections[DEFAULT_DB_ALIAS].get_connection_params()
+        )
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {quote_ident(self.channel, cursor)}')
+            ready()
+            while not stopped.is_set():
+                ready = select.select([connection], [], [], self.interval)
+                if not ready[0]:
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    receive(connection.notifies.pop(0).payload)
+        finally:
+            connection.close()
+
+
+class DatabaseTransport:
+    """
+    Таблица событий, которую воркеры опрашивают раз в interval секунд.
+    Рассчитан на базы с последовательной записью (SQLite) и тесты.
+    """
+
+    def __init__(self, interval, timeout):
+        self.interval = interval
+        self.timeout = timeout
+
+    @property
+    def events(self):
+        from recipes.models import InvalidationEvent
+
+        return InvalidationEvent.objects.using(DEFAULT_DB_ALIAS)
+
+    def send(self, payload):
+        self.events.create(sender=sender_id(), payload=payload)
+
+    def listen(self, receive, stopped, ready):
+        try:
+            last_id = self.events.aggregate(last_id=Max('id'))['last_id']
+            last_id = last_id or 0
+            ready()
+            polls = 0
+            while not stopped.wait(self.interval):
+                rows = self.events.filter(id__gt=last_id).order_by('id')
+                for last_id, payload in rows.values_list('id', 'payload'):
+                    receive(payload)
+                polls += 1
+                if polls * self.interval >= self.timeout:
+                    polls = 0
+                    self.events.filter(
+                        created_at__lt=timezone.now()
+                        - timedelta(seconds=self.timeout)
+                    ).delete()
+        finally:
+            connections[DEFAULT_DB_ALIAS].close()
+
+
+def get_transport():
+    """Транспорт из настроек или None для INVALIDATION_BUS=local."""
+    global _transport
+    if _transport is None:
+        bus = settings.INVALIDATION_BUS
+        interval = settings.INVALIDATION_POLL_INTERVAL
+        if bus == 'postgres':
+            _transport = PostgresTransport(
+                settings.INVALIDATION_CHANNEL, interval
+            )
+        elif bus == 'database':
+            _transport = DatabaseTransport(
+                interval, settings.INVALIDATION_EVENT_TIMEOUT
+            )
+        elif bus != 'local':
+            raise ValueError(f'Неизвестная шина сброса кешей: {bus}')
+    return _transport
+
+
+def publish(kind, ids=()):
+    """
+    Публикует событие после фиксации текущей транзакции. События одной
+    транзакции объединяются по виду; ids=None означает все объекты.
+    """
+    if get_transport() is None:
+        return
+    connection = connections[DEFAULT_DB_ALIAS]
+    events = getattr(_pending, 'events', None)
+    # После отката транзакции отложенная отправка отменяется,
+    # а накопленные события теряют смысл.
+    scheduled = events is not None and any(
+        entry[1] is flush for entry in connection.run_on_commit
+    )
+    if not scheduled:
+        events = _pending.events = {}
+    if ids is None or events.get(kind, ()) is None:
+        events[kind] = None
+    else:
+        events.setdefault(kind, set()).update(ids)
+        if len(events[kind]) > MAX_EVENT_IDS:
+            events[kind] = None
+    if not scheduled:
+        transaction.on_commit(flush)
+
+
+def flush():
+    """Отправляет накопленные события потока."""
+    events = getattr(_pending, 'events', None) or {}
+    _pending.events = None
+    transport = get_transport()
+    for kind, ids in events.items():
+        payload = json.dumps(
+            {
+                'sender': sender_id(),
+                'kind': kind,
+                'ids': None if ids is None else sorted(ids),
+            }
+        )
+        try:
+            transport.send(payload)
+        except DatabaseError:
+            logger.warning(
+                'Событие сброса кешей не отправлено: %s', payload,
+                exc_info=True,
+            )
+
+
+def forget_namespaces(*names):
+    """Сбрасывает версии пространств имен в L1 этого процесса."""
+    cache.forget([NAMESPACE_KEY.format(name=name) for name in names])
+
+
+def apply_recipes(ids):
+    if ids is None:
+        for index in (
+            ingredient_index,
+            tag_index,
+            similarity_index,
+            recent_index,
+        ):
+            index.reset()
+        cache.clear_local()
+        return
+    for recipe_id in ids:
+        ingredient_index.refresh_recipe(recipe_id)
+        tag_index.refresh_recipe(recipe_id)
+        similarity_index.refresh_recipe(recipe_id, store=False)
+        recent_index.refresh_recipe(recipe_id)
+    cache.forget([fragment_key(recipe_id) for recipe_id in ids])
+    forget_namespaces(RECIPES)
+
+
+def apply_tags(ids):
+    tag_index.reset()
+    recent_index.clear_tags()
+    forget_namespaces(TAGS, RECIPES)
+
+
+def apply_ingredients(ids):
+    forget_namespaces(INGREDIENTS, RECIPES)
+
+
+def apply_users(ids):
+    if ids is None:
+        auth_cache.clear()
+    else:
+        for user_id in ids:
+            invalidate_user(user_id)
+    forget_namespaces(USERS)
+
+
+def apply_lists(ids):
+    if ids is None:
+        cache.clear_local()
+        return
+    forget_namespaces(*(lists_namespace(user_id) for user_id in ids))
+
+
+HANDLERS = {
+    RECIPES: apply_recipes,
+    TAGS: apply_tags,
+    INGREDIENTS: apply_ingredients,
+    USERS: apply_users,
+    LISTS: apply_lists,
+}
+
+
+def apply_all():
+    """Сбрасывает все кеши процесса, когда события могли быть потеряны."""
+    for handler in HANDLERS.values():
+        handler(None)
+
+
+def receive(payload):
+    """Применяет событие другого процесса."""
+    event = json.loads(payload)
+    if event['sender'] == sender_id():
+        return
+    handler = HANDLERS.get(event['kind'])
+    if handler is None:
+        logger.warning('Неизвестное событие сброса кешей: %s', payload)
+        return
+    handler(event['ids'])
+
+
+class Listener(threading.Thread):
+    """
+    Фоновый поток воркера, получающий события шины.
+
+    Обработчики событий обращаются к базе через соединение Django этого
+    потока. Запросов, которые закрывали бы его, здесь нет, поэтому до и
+    после каждого события закрываются устаревшие и сломанные соединения,
+    как в начале и конце HTTP-запроса.
+    """
+
+    def __init__(self, transport):
+        super().__init__(name='invalidation-listener', daemon=True)
+        self.transport = transport
+        self.stopped = threading.Event()
+        # Установлен после первого подключения и сброса кешей
+        self.ready = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.transport.listen(
+                    self.receive, self.stopped, self.catch_up
+                )
+            except Exception:
+                logger.exception('Слушатель шины сброса кешей остановлен')
+            if self.stopped.wait(RETRY_INTERVAL):
+                return
+
+    def catch_up(self):
+        """
+        Вызывается транспортом сразу после подписки на события. Все, что
+        изменилось раньше — до запуска воркера или пока слушатель был
+        отключен, — шина уже не доставит, поэтому кеши и индексы процесса
+        сбрасываются и строятся заново при обращении.
+        """
+        try:
+            self.apply(apply_all)
+        except DatabaseError:
+            logger.warning('Кеши не сброшены', exc_info=True)
+        self.ready.set()
+
+    @staticmethod
+    def apply(handler, *args):
+        close_old_connections()
+        try:
+            handler(*args)
+        finally:
+            close_old_connections()
+
+    def receive(self, payload):
+        self.apply(receive, payload)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def start_listener():
+    """
+    Запускает слушатель в текущем процессе. Вызывается в воркере после
+    fork: потоки мастера в воркеры не переходят.
+    """
+    global _listener
+    transport = get_transport()
+    if transport is None:
+        return None
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = Listener(transport)
+            _listener.start()
+        return _listener
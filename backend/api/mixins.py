@@ -1,9 +1,13 @@
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 
 from recipes.models import Recipe, RecipeIngredient
+from recipes.versions import get_catalog_versions
+from .conditional import make_etag, patch_cache_headers
 
 
 class RecipeAccessMixin:
@@ -49,6 +53,56 @@ class AdminOrReadOnlyMixin:
         )
 
 
+class ConditionalGetMixin:
+    """
+    Миксин представления для условных GET-запросов: отвечает 304 при
+    совпадении валидаторов и добавляет ETag, Last-Modified и заголовки
+    кеширования.
+    """
+
+    validators = None
+
+    def not_modified(self, etag, last_modified=None):
+        """
+        Ответ 304, если клиент прислал актуальные валидаторы, иначе None.
+        """
+        self.validators = (etag, last_modified)
+        return get_conditional_response(
+            self.request,
+            etag=etag,
+            last_modified=(
+                int(last_modified.timestamp()) if last_modified else None
+            ),
+        )
+
+    def catalog_not_modified(self, name):
+        """Проверка валидаторов по версии справочника."""
+        version, updated_at = get_catalog_versions(name)[name]
+        etag = make_etag(
+            name,
+            version,
+            self.request.get_full_path(),
+            self.request.accepted_renderer.format,
+        )
+        return self.not_modified(etag, updated_at)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self.validators is None or response.status_code not in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED,
+        ):
+            return response
+        etag, last_modified = self.validators
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_cache_headers(request, response)
+        return response
+
+
 class SubscriptionMixin:
     """
     Миксин для проверки подписки пользователя.
@@ -64,6 +118,18 @@ class SubscriptionMixin:
         )
 
 
+class SparseFieldsMixin:
+    """
+    Миксин сериализатора, оставляющий только поля из аргумента fields.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 class PasswordValidationMixin:
     """
     Миксин для валидации пароля.
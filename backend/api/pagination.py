@@ -1,6 +1,42 @@
+from collections.abc import Sequence
+from functools import partial
+
 from django.conf import settings
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination
 
+from .counts import count_objects
+
+
+class IndexedIds(Sequence):
+    """Первые id упорядоченной выборки и ее полный размер."""
+
+    def __init__(self, ids, count):
+        self.ids = ids
+        self.total = count
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, index):
+        return self.ids[index]
+
+
+class CountedPaginator(Paginator):
+    """Paginator, который считает объекты выборки функцией counter."""
+
+    def __init__(self, object_list, per_page, counter=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.counter = counter
+
+    @cached_property
+    def count(self):
+        if self.counter is None or not isinstance(self.object_list, QuerySet):
+            return super().count
+        return self.counter(self.object_list)
+
 
 class PagePagination(PageNumberPagination):
     """
@@ -9,3 +45,38 @@ class PagePagination(PageNumberPagination):
 
     page_size = settings.DEFAULT_PAGE_SIZE
     page_size_query_param = 'limit'
+    django_paginator_class = CountedPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Число объектов зависит от запроса: ?count=exact, фильтры и
+        # пользователь (см. api.counts).
+        self.django_paginator_class = partial(
+            CountedPaginator,
+            counter=partial(
+                count_objects,
+                request,
+                exclude=(self.page_query_param, self.page_size_query_param),
+            ),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def paginate_ids(self, ids, count, request):
+        """
+        Страница по первым id выборки из индекса в памяти, count — размер
+        всей выборки. None, если страница выходит за известные id или
+        номер страницы неверен: тогда страница строится запросом к базе.
+        """
+        paginator = self.django_paginator_class(
+            IndexedIds(ids, count), self.get_page_size(request)
+        )
+        try:
+            page = paginator.page(
+                request.query_params.get(self.page_query_param, 1)
+            )
+        except InvalidPage:
+            return None
+        if page.end_index() > len(ids):
+            return None
+        self.page = page
+        self.request = request
+        return list(page)
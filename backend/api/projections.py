@@ -0,0 +1,415 @@
+"""
+Быстрое чтение рецептов без создания экземпляров моделей.
+
+RecipeProjection выбирает кортежи values_list() для рецептов, авторов,
+тегов и ингредиентов несколькими запросами на всю страницу и собирает
+из них тот же JSON, что и RecipeReadSerializer.
+"""
+
+from operator import attrgetter, itemgetter
+
+import orjson
+from django.contrib.auth import get_user_model
+from django.db import connections
+
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscribe,
+    Tag,
+)
+from . import constants
+from .fieldsets import EXPAND_PARAM, FIELDS_PARAM
+
+User = get_user_model()
+
+FIELDSET_PARAMS = {FIELDS_PARAM, EXPAND_PARAM}
+
+
+class Row:
+    """Легковесная строка результата values_list()."""
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_columns(cls, columns, values):
+        """Строка только с выбранными столбцами."""
+        row = cls.__new__(cls)
+        for name, value in zip(columns, values):
+            setattr(row, name, value)
+        return row
+
+
+def group_by_recipe(rows, make):
+    """Группирует строки по первому столбцу (id рецепта)."""
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row[0], []).append(make(row))
+    return grouped
+
+
+class RecipeRow(Row):
+    """Строка рецепта из values_list()."""
+
+    __slots__ = (
+        'id',
+        'author_id',
+        'name',
+        'image',
+        'text',
+        'cooking_time',
+        'is_favorited',
+        'is_in_shopping_cart',
+    )
+
+
+class AuthorRow(Row):
+    """Строка автора рецепта."""
+
+    __slots__ = (
+        'id',
+        'email',
+        'username',
+        'first_name',
+        'last_name',
+        'avatar',
+    )
+
+
+class TagRow(Row):
+    """Строка тега рецепта."""
+
+    __slots__ = ('recipe_id', 'id', 'name', 'slug')
+
+
+class IngredientRow(Row):
+    """Строка ингредиента рецепта с количеством."""
+
+    __slots__ = ('recipe_id', 'id', 'name', 'measurement_unit', 'amount')
+
+
+# Флаги текущего пользователя, не входящие в публичные фрагменты
+PERSONAL_FIELDS = ('is_favorited', 'is_in_shopping_cart')
+# Столбцы values_list(), нужные для полей ответа (id выбирается всегда)
+FIELD_COLUMNS = {
+    'author': 'author_id',
+    'is_favorited': 'is_favorited',
+    'is_in_shopping_cart': 'is_in_shopping_cart',
+    'name': 'name',
+    'image': 'image',
+    'text': 'text',
+    'cooking_time': 'cooking_time',
+}
+
+
+# Документ рецепта целиком одним запросом (PostgreSQL). Ключи
+# json_build_object идут в том же порядке, что и поля RecipeReadSerializer.
+RECIPE_DOCUMENT_SQL = """
+SELECT json_build_object(
+    'id', r.id,
+    'tags', COALESCE((
+        SELECT json_agg(
+            json_build_object('id', t.id, 'name', t.name, 'slug', t.slug)
+            ORDER BY t.id DESC
+        )
+        FROM {recipe_tags} rt JOIN {tag} t ON t.id = rt.tag_id
+        WHERE rt.recipe_id = r.id
+    ), '[]'::json),
+    'author', json_build_object(
+        'email', u.email,
+        'id', u.id,
+        'username', u.username,
+        'first_name', u.first_name,
+        'last_name', u.last_name,
+        'is_subscribed', EXISTS(
+            SELECT 1 FROM {subscribe} s
+            WHERE s.user_id = %(user_id)s AND s.author_id = u.id
+        ),
+        'avatar', u.avatar
+    ),
+    'ingredients', COALESCE((
+        SELECT json_agg(
+            json_build_object(
+                'id', i.id,
+                'name', i.name,
+                'measurement_unit', i.measurement_unit,
+                'amount', ri.amount
+            )
+            ORDER BY ri.id DESC
+        )
+        FROM {recipe_ingredient} ri JOIN {ingredient} i
+            ON i.id = ri.ingredient_id
+        WHERE ri.recipe_id = r.id
+    ), '[]'::json),
+    'is_favorited', EXISTS(
+        SELECT 1 FROM {favorite} f
+        WHERE f.user_id = %(user_id)s AND f.recipe_id = r.id
+    ),
+    'is_in_shopping_cart', EXISTS(
+        SELECT 1 FROM {cart} c JOIN {cart_recipe} cr
+            ON cr.shoppingcart_id = c.id
+        WHERE c.user_id = %(user_id)s AND cr.recipe_id = r.id
+    ),
+    'name', r.name,
+    'image', r.image,
+    'text', r.text,
+    'cooking_time', r.cooking_time
+)::text
+FROM {recipe} r JOIN {user} u ON u.id = r.author_id
+WHERE r.id = %(recipe_id)s
+"""
+
+
+def recipe_document_sql(connection):
+    """Текст запроса документа рецепта с именами таблиц из моделей."""
+    tables = {
+        'recipe': Recipe,
+        'recipe_tags': Recipe.tags.through,
+        'tag': Tag,
+        'user': User,
+        'subscribe': Subscribe,
+        'recipe_ingredient': RecipeIngredient,
+        'ingredient': Ingredient,
+        'favorite': FavoriteRecipe,
+        'cart': ShoppingCart,
+        'cart_recipe': ShoppingCart.recipe.through,
+    }
+    return RECIPE_DOCUMENT_SQL.format(
+        **{
+            name: connection.ops.quote_name(model._meta.db_table)
+            for name, model in tables.items()
+        }
+    )
+
+
+class RecipeProjection:
+    """
+    Сборка представления рецептов по кортежам из базы.
+
+    Результат совпадает с RecipeReadSerializer, в том числе порядком
+    ключей, тегов (по убыванию id) и ингредиентов (по убыванию id строки
+    RecipeIngredient). При выборочных полях (?fields=, ?expand=) из базы
+    читается только то, что попадет в ответ.
+
+    Публичная проекция (public=True) строит фрагменты для кеша и
+    документы рецептов: без флагов пользователя и с относительными
+    ссылками на файлы. Запрос для нее может быть None.
+    """
+
+    recipe_storage = Recipe._meta.get_field('image').storage
+    avatar_storage = User._meta.get_field('avatar').storage
+
+    def __init__(
+        self,
+        request,
+        fields=constants.RECIPE_FIELDS,
+        expand=constants.RECIPE_EXPANDABLE_FIELDS,
+        public=False,
+    ):
+        self.request = request
+        self.user = getattr(request, 'user', None)
+        self.fields = tuple(fields)
+        self.expand = set(expand)
+        self.public = public
+        self.columns = ('id',) + tuple(
+            FIELD_COLUMNS[name]
+            for name in self.fields
+            if name in FIELD_COLUMNS
+            and not (public and name in PERSONAL_FIELDS)
+        )
+
+    @property
+    def is_complete(self):
+        """Запрошены все поля с раскрытыми вложенными объектами."""
+        return self.fields == constants.RECIPE_FIELDS and self.expand >= set(
+            constants.RECIPE_EXPANDABLE_FIELDS
+        )
+
+    def values(self, queryset):
+        """Кортежи рецептов со столбцами self.columns."""
+        return queryset.prefetch_related(None).values_list(*self.columns)
+
+    def file_url(self, storage, name):
+        if not name:
+            return None
+        url = storage.url(name)
+        if self.public:
+            return url
+        return self.request.build_absolute_uri(url)
+
+    def fetch_authors(self, author_ids):
+        rows = User.objects.filter(id__in=author_ids).values_list(
+            *AuthorRow.__slots__
+        )
+        return {row[0]: AuthorRow(*row) for row in rows}
+
+    def fetch_subscriptions(self, author_ids):
+        if self.public or not self.user.is_authenticated:
+            return set()
+        return set(
+            Subscribe.objects.filter(
+                user_id=self.user.id, author_id__in=author_ids
+            ).values_list('author_id', flat=True)
+        )
+
+    @staticmethod
+    def fetch_tags(recipe_ids, expanded=True):
+        rows = Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('-tag_id')
+        if expanded:
+            rows = rows.values_list(
+                'recipe_id', 'tag_id', 'tag__name', 'tag__slug'
+            )
+            return group_by_recipe(rows, lambda row: TagRow(*row))
+        return group_by_recipe(
+            rows.values_list('recipe_id', 'tag_id'), itemgetter(1)
+        )
+
+    @staticmethod
+    def fetch_ingredients(recipe_ids, expanded=True):
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('-id')
+        if expanded:
+            rows = rows.values_list(
+                'recipe_id',
+                'ingredient_id',
+                'ingredient__name',
+                'ingredient__measurement_unit',
+                'amount',
+            )
+            return group_by_recipe(rows, lambda row: IngredientRow(*row))
+        return group_by_recipe(
+            rows.values_list('recipe_id', 'ingredient_id'), itemgetter(1)
+        )
+
+    def author_data(self, author, subscriptions):
+        return {
+            'email': author.email,
+            'id': author.id,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+            'is_subscribed': author.id in subscriptions,
+            'avatar': self.file_url(self.avatar_storage, author.avatar),
+        }
+
+    def document(self, using, recipe_id):
+        """
+        Документ рецепта одним запросом к PostgreSQL. Остается только
+        превратить имена файлов в абсолютные ссылки.
+        """
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                recipe_document_sql(connection),
+                {
+                    'recipe_id': recipe_id,
+                    'user_id': None if self.public else self.user.id,
+                },
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        data = orjson.loads(row[0])
+        data['image'] = self.file_url(self.recipe_storage, data['image'])
+        data['author']['avatar'] = self.file_url(
+            self.avatar_storage, data['author']['avatar']
+        )
+        return data
+
+    def retrieve(self, queryset, recipe_id):
+        """
+        Представление одного рецепта или None, если его нет.
+
+        На PostgreSQL без дополнительных фильтров в запросе документ
+        строится одним SQL-запросом, иначе — через values().
+        """
+        recipe_id = int(recipe_id)
+        if (
+            connections[queryset.db].vendor == 'postgresql'
+            and self.is_complete
+            and not self.request.query_params.keys() - FIELDSET_PARAMS
+        ):
+            return self.document(queryset.db, recipe_id)
+        data = self.serialize(self.values(queryset.filter(pk=recipe_id)))
+        return data[0] if data else None
+
+    def build_author(self, recipes):
+        if 'author' not in self.expand:
+            return attrgetter('author_id')
+        author_ids = {recipe.author_id for recipe in recipes}
+        authors = self.fetch_authors(author_ids)
+        subscriptions = self.fetch_subscriptions(author_ids)
+        return lambda recipe: self.author_data(
+            authors[recipe.author_id], subscriptions
+        )
+
+    def build_tags(self, recipes):
+        recipe_ids = [recipe.id for recipe in recipes]
+        if 'tags' not in self.expand:
+            tag_ids = self.fetch_tags(recipe_ids, expanded=False)
+            return lambda recipe: tag_ids.get(recipe.id, [])
+        tags = self.fetch_tags(recipe_ids)
+        return lambda recipe: [
+            {'id': tag.id, 'name': tag.name, 'slug': tag.slug}
+            for tag in tags.get(recipe.id, ())
+        ]
+
+    def build_ingredients(self, recipes):
+        recipe_ids = [recipe.id for recipe in recipes]
+        if 'ingredients' not in self.expand:
+            ingredient_ids = self.fetch_ingredients(
+                recipe_ids, expanded=False
+            )
+            return lambda recipe: ingredient_ids.get(recipe.id, [])
+        ingredients = self.fetch_ingredients(recipe_ids)
+        return lambda recipe: [
+            {
+                'id': ingredient.id,
+                'name': ingredient.name,
+                'measurement_unit': ingredient.measurement_unit,
+                'amount': ingredient.amount,
+            }
+            for ingredient in ingredients.get(recipe.id, ())
+        ]
+
+    def build_image(self, recipes):
+        return lambda recipe: self.file_url(self.recipe_storage, recipe.image)
+
+    def build_flag(self, name):
+        if self.public:
+            return lambda recipe: False
+        return lambda recipe: bool(getattr(recipe, name))
+
+    def builders(self, recipes):
+        """Пары (поле, функция от RecipeRow) для запрошенных полей."""
+        builders = []
+        for name in self.fields:
+            if name in PERSONAL_FIELDS:
+                build = self.build_flag(name)
+            elif hasattr(self, f'build_{name}'):
+                build = getattr(self, f'build_{name}')(recipes)
+            else:
+                build = attrgetter(name)
+            builders.append((name, build))
+        return builders
+
+    def serialize(self, values):
+        """Представления рецептов по кортежам из values()."""
+        recipes = [RecipeRow.from_columns(self.columns, row) for row in values]
+        if not recipes:
+            return []
+        builders = self.builders(recipes)
+        return [
+            {name: build(recipe) for name, build in builders}
+            for recipe in recipes
+        ]
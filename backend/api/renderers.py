@@ -0,0 +1,76 @@
+import math
+from decimal import Decimal
+
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+SCALARS = frozenset((str, int, bool))
+
+
+def is_non_finite(value):
+    if isinstance(value, float):
+        return not math.isfinite(value)
+    if isinstance(value, Decimal):
+        return not value.is_finite()
+    return False
+
+
+def has_non_finite(data):
+    """Есть ли в данных NaN или бесконечность."""
+    if not isinstance(data, (dict, list, tuple)):
+        return is_non_finite(data)
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        for item in value.values() if isinstance(value, dict) else value:
+            # Строки, целые и None — почти весь ответ, их пропускаем
+            # без проверок isinstance.
+            if item is None or type(item) in SCALARS:
+                continue
+            if isinstance(item, (dict, list, tuple)):
+                stack.append(item)
+            elif is_non_finite(item):
+                return True
+    return False
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON-рендерер на orjson с тем же результатом, что и у JSONRenderer.
+
+    Даты, Decimal, ленивые строки и прочие нестандартные типы
+    преобразуются тем же энкодером DRF. Если нужен отступ или orjson
+    не может сериализовать данные (например, слишком большое целое),
+    используется стандартный рендерер.
+
+    orjson записывает NaN и бесконечности как null, а JSONRenderer при
+    STRICT_JSON выбрасывает ValueError. Поэтому, если в ответе есть null
+    и в данных нашлось такое число, ответ тоже строит стандартный рендерер.
+    """
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    default = staticmethod(JSONEncoder().default)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            ret = orjson.dumps(data, default=self.default, option=self.options)
+        except (TypeError, orjson.JSONEncodeError):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        if b'null' in ret and has_non_finite(data):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        # Как и JSONRenderer, экранируем U+2028 и U+2029, чтобы ответ
+        # оставался корректным JavaScript.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029'
+        )
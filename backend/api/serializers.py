@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 
@@ -12,16 +13,20 @@ from recipes.models import (
     Tag,
 )
 from . import constants
+from .documents import deferred_documents
 from .mixins import (
     IngredientCreationMixin,
     PasswordValidationMixin,
+    SparseFieldsMixin,
     SubscriptionMixin,
 )
 
 User = get_user_model()
 
 
-class UserSerializer(SubscriptionMixin, serializers.ModelSerializer):
+class UserSerializer(
+    SparseFieldsMixin, SubscriptionMixin, serializers.ModelSerializer
+):
     """
     Сериализатор для отображения списка пользователей.
     """
@@ -264,22 +269,29 @@ class RecipeCreateUpdateSerializer(
             raise serializers.ValidationError(constants.RECIPE_TEXT_EMPTY)
         return value.strip()
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        self.create_ingredients(ingredients, recipe)
+        with deferred_documents() as changed:
+            recipe = Recipe.objects.create(**validated_data)
+            recipe.tags.set(tags)
+            self.create_ingredients(ingredients, recipe)
+            changed.add(recipe.id)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            instance.ingredients.clear()
-            self.create_ingredients(ingredients, instance)
-        if 'tags' in validated_data:
-            instance.tags.set(validated_data.pop('tags'))
-        return super().update(instance, validated_data)
+        with deferred_documents() as changed:
+            if 'ingredients' in validated_data:
+                ingredients = validated_data.pop('ingredients')
+                instance.ingredients.clear()
+                self.create_ingredients(ingredients, instance)
+            if 'tags' in validated_data:
+                instance.tags.set(validated_data.pop('tags'))
+            instance = super().update(instance, validated_data)
+            changed.add(instance.id)
+        return instance
 
     def to_representation(self, instance):
         return RecipeReadSerializer(instance, context=self.context).data
@@ -333,6 +345,21 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         ).exists()
 
 
+class PantryQuerySerializer(serializers.Serializer):
+    """Сериализатор параметров подбора рецептов по кладовой."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        error_messages={'empty': constants.NO_INGREDIENTS_ERROR},
+    )
+    max_missing = serializers.IntegerField(
+        min_value=0,
+        max_value=constants.MAX_PANTRY_MISSING,
+        default=constants.MAX_PANTRY_MISSING,
+    )
+
+
 class SetAvatarSerializer(serializers.Serializer):
     """Сериализатор для загрузки аватара."""
 
@@ -424,58 +451,6 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         ).data
 
 
-class FavoriteRecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор для избранных рецептов."""
-
-    recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
-
-    class Meta:
-        model = FavoriteRecipe
-        fields = ('recipe',)
-
-    def validate(self, data):
-        user = self.context['request'].user
-        recipe = data['recipe']
-
-        if user.favorite_recipes.filter(recipe=recipe).exists():
-            raise serializers.ValidationError(
-                {'errors': constants.ERROR_RECIPE_ALREADY_FAVORITED}
-            )
-        return data
-
-    def create(self, validated_data):
-        user = self.context['request'].user
-        recipe = validated_data['recipe']
-        return FavoriteRecipe.objects.create(user=user, recipe=recipe)
-
-
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    """Сериализатор для корзины покупок."""
-
-    recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
-
-    class Meta:
-        model = ShoppingCart
-        fields = ('recipe',)
-
-    def validate(self, data):
-        user = self.context['request'].user
-        recipe = data['recipe']
-
-        if user.shopping_cart.recipe.filter(id=recipe.id).exists():
-            raise serializers.ValidationError(
-                {'errors': constants.RECIPE_ALREADY_IN_CART}
-            )
-        return data
-
-    def create(self, validated_data):
-        user = self.context['request'].user
-        recipe = validated_data['recipe']
-        shopping_cart, _ = ShoppingCart.objects.get_or_create(user=user)
-        shopping_cart.recipe.add(recipe)
-        return shopping_cart
-
-
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Сериализатор для краткого представления рецепта."""
 
@@ -0,0 +1,205 @@
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from foodgram.cache import bump_generation
+from recipes.models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscribe,
+    Tag,
+)
+from recipes.signals import cart_user_ids
+from recipes.versions import AUTHOR_FIELDS
+from . import invalidation
+from .authentication import invalidate_token, invalidate_user
+from .documents import (
+    deleting_recipes,
+    finish_deleting,
+    schedule_documents,
+    start_deleting,
+)
+from .fragments import schedule_invalidation
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def drop_cached_token(sender, instance, **kwargs):
+    """Выход из системы удаляет токен, а вместе с ним запись в кеше."""
+    invalidate_token(instance.key)
+    invalidation.publish(invalidation.USERS, [instance.user_id])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    """Смена пароля или данных пользователя сбрасывает его записи."""
+    invalidate_user(instance.pk)
+    invalidation.publish(invalidation.USERS, [instance.pk])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_delete, sender=Subscribe)
+def bump_users_generation(sender, update_fields=None, **kwargs):
+    """Делает устаревшими закешированные данные пользователей."""
+    if update_fields is not None and 'last_login' in update_fields:
+        return
+    bump_generation('users')
+
+
+def recipes_changed(recipe_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Перестраивает документы рецептов и сбрасывает их фрагменты и индексы
+    во всех воркерах. Фрагменты и события сбрасываются один раз после
+    фиксации транзакции.
+    """
+    recipe_ids = list(recipe_ids)
+    schedule_documents(recipe_ids)
+    schedule_invalidation(recipe_ids, using)
+    invalidation.publish(invalidation.RECIPES, recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def drop_recipe_fragment(sender, instance, using, **kwargs):
+    """
+    Изменение рецепта сбрасывает его фрагмент, создание — отметку
+    об отсутствии рецепта с таким id.
+    """
+    recipes_changed([instance.id], using)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_deleting_recipe(sender, instance, using, **kwargs):
+    start_deleting(instance.id, using)
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_deleted_recipe(sender, instance, using, **kwargs):
+    # Подключен после drop_recipe_fragment: документ удаленного рецепта
+    # не перестраивается и там.
+    finish_deleting(instance.id, using)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def drop_recipe_ingredients_fragment(sender, instance, using, **kwargs):
+    """
+    Изменение ингредиентов рецепта сбрасывает его фрагмент. Каскадное
+    удаление вместе с рецептом обрабатывает сигнал самого рецепта.
+    """
+    deleting = deleting_recipes(using)
+    if deleting and instance.recipe_id in deleting:
+        return
+    recipes_changed([instance.recipe_id], using)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def drop_recipe_tags_fragments(
+    sender, instance, action, reverse, pk_set, using, **kwargs
+):
+    """Изменение тегов рецептов сбрасывает их фрагменты."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            recipes_changed([instance.id], using)
+    elif action in ('post_add', 'post_remove'):
+        recipes_changed(pk_set, using)
+    elif action == 'pre_clear':
+        recipes_changed(instance.recipes.values_list('id', flat=True), using)
+
+
+@receiver(post_save, sender=User)
+def drop_author_fragments(
+    sender, instance, created, update_fields, using, **kwargs
+):
+    """Изменение профиля автора сбрасывает фрагменты его рецептов."""
+    if created:
+        return
+    if update_fields is None or AUTHOR_FIELDS.intersection(
+        update_fields
+    ):
+        recipes_changed(instance.recipe.values_list('id', flat=True), using)
+
+
+@receiver(post_save, sender=Tag)
+def rebuild_tag_documents(sender, instance, created, **kwargs):
+    """Изменение тега перестраивает документы его рецептов."""
+    if not created:
+        schedule_documents(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tag_recipes(sender, instance, **kwargs):
+    # Связи тега с рецептами удаляются без сигналов m2m_changed.
+    instance._recipe_ids = list(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def rebuild_deleted_tag_documents(sender, instance, **kwargs):
+    """Удаление тега перестраивает документы его рецептов."""
+    schedule_documents(getattr(instance, '_recipe_ids', ()))
+
+
+@receiver(post_save, sender=Ingredient)
+def rebuild_ingredient_documents(sender, instance, created, **kwargs):
+    """Изменение ингредиента перестраивает документы рецептов с ним."""
+    if not created:
+        schedule_documents(
+            RecipeIngredient.objects.filter(ingredient=instance)
+            .values_list('recipe_id', flat=True)
+            .distinct()
+        )
+
+
+@receiver(post_save, sender=Subscribe)
+@receiver(post_delete, sender=Subscribe)
+def publish_subscriptions(sender, instance, **kwargs):
+    """
+    Подписка сбрасывает в других воркерах данные подписчика и автора,
+    а не весь кеш аутентификации.
+    """
+    invalidation.publish(
+        invalidation.USERS, [instance.user_id, instance.author_id]
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def publish_tags(sender, **kwargs):
+    """Изменение тегов сбрасывает их индекс в других воркерах."""
+    invalidation.publish(invalidation.TAGS)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def publish_ingredients(sender, **kwargs):
+    """Изменение ингредиентов сбрасывает их кеш в других воркерах."""
+    invalidation.publish(invalidation.INGREDIENTS)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+def publish_favorites(sender, instance, **kwargs):
+    """Избранное сбрасывает поколение списков в других воркерах."""
+    invalidation.publish(invalidation.LISTS, [instance.user_id])
+
+
+@receiver(m2m_changed, sender=ShoppingCart.recipe.through)
+def publish_cart(sender, instance, action, reverse, pk_set, **kwargs):
+    """Покупки сбрасывают поколение списков в других воркерах."""
+    user_ids = cart_user_ids(instance, action, reverse, pk_set)
+    if user_ids:
+        invalidation.publish(invalidation.LISTS, user_ids)
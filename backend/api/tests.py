@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.test import TestCase, override_settings
+
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart, Subscribe
+from . import toggles
+
+User = get_user_model()
+
+LOCAL_CACHES = {
+    'default': settings.CACHES['default'],
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+def describe(instance):
+    """Модель и значения полей экземпляра, кроме id и даты создания."""
+    return (
+        type(instance),
+        {
+            field.attname: getattr(instance, field.attname)
+            for field in instance._meta.concrete_fields
+            if field.attname not in ('id', 'created')
+        },
+    )
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TogglesTests(TestCase):
+    """
+    Переключатели отправляют receivers те же сигналы с теми же
+    аргументами, что и соответствующие операции ORM.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = (
+            User.objects.create_user(
+                email=f'{name}@example.com',
+                username=name,
+                first_name=name,
+                last_name=name,
+                password='password',
+            )
+            for name in ('user', 'author')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author,
+            name='Рецепт',
+            text='Текст',
+            cooking_time=10,
+            image='recipes/images/recipe.png',
+        )
+
+    def signals(self, operation):
+        """Сигналы изменений, отправленные операцией, с аргументами."""
+        calls = []
+
+        def receiver(signal, sender, instance, **kwargs):
+            # Переключатели отправляют только post_add и post_remove.
+            if signal is m2m_changed and kwargs['action'].startswith('pre_'):
+                return
+            calls.append((signal, sender, describe(instance), kwargs))
+
+        for signal in (post_save, post_delete, m2m_changed):
+            signal.connect(receiver, weak=False)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                operation()
+        finally:
+            for signal in (post_save, post_delete, m2m_changed):
+                signal.disconnect(receiver)
+        return calls
+
+    def assert_same_signals(self, orm_add, orm_remove, add, remove):
+        expected = [self.signals(orm_add), self.signals(orm_remove)]
+        self.assertTrue(all(expected))
+        self.assertEqual([self.signals(add), self.signals(remove)], expected)
+
+    def test_favorite_signals(self):
+        self.assert_same_signals(
+            lambda: FavoriteRecipe.objects.create(
+                user=self.user, recipe=self.recipe
+            ),
+            lambda: FavoriteRecipe.objects.get(user=self.user).delete(),
+            lambda: toggles.add_favorite(self.user.id, self.recipe.id),
+            lambda: toggles.remove_favorite(self.user.id, self.recipe.id),
+        )
+
+    def test_cart_signals(self):
+        cart = ShoppingCart.objects.get(user=self.user)
+        self.assert_same_signals(
+            lambda: cart.recipe.add(self.recipe),
+            lambda: cart.recipe.remove(self.recipe),
+            lambda: toggles.add_to_cart(self.user.id, self.recipe.id),
+            lambda: toggles.remove_from_cart(self.user.id, self.recipe.id),
+        )
+
+    def test_subscription_signals(self):
+        self.assert_same_signals(
+            lambda: Subscribe.objects.create(
+                user=self.user, author=self.author
+            ),
+            lambda: Subscribe.objects.get(user=self.user).delete(),
+            lambda: toggles.subscribe(self.user.id, self.author.id),
+            lambda: toggles.unsubscribe(self.user.id, self.author.id),
+        )
+
+    def test_repeated_toggles_change_nothing(self):
+        user_id, recipe_id = self.user.id, self.recipe.id
+        for add, remove in (
+            (toggles.add_favorite, toggles.remove_favorite),
+            (toggles.add_to_cart, toggles.remove_from_cart),
+        ):
+            with self.subTest(add=add.__name__):
+                self.assertIs(add(user_id, recipe_id), True)
+                self.assertIs(add(user_id, recipe_id), False)
+                self.assertIs(remove(user_id, recipe_id), True)
+                self.assertIs(remove(user_id, recipe_id), False)
+        self.assertIsNotNone(toggles.subscribe(user_id, self.author.id))
+        self.assertIsNone(toggles.subscribe(user_id, self.author.id))
+        self.assertIs(toggles.unsubscribe(user_id, self.author.id), True)
+        self.assertIs(toggles.unsubscribe(user_id, self.author.id), False)
+
+    def test_cart_is_created_on_first_add(self):
+        ShoppingCart.objects.filter(user=self.user).delete()
+        self.assertIs(toggles.add_to_cart(self.user.id, self.recipe.id), True)
+        self.assertQuerysetEqual(
+            ShoppingCart.objects.get(user=self.user).recipe.all(),
+            [self.recipe],
+            transform=lambda recipe: recipe,
+        )
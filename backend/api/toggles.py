@@ -0,0 +1,189 @@
+"""
+Переключатели избранного, списка покупок и подписок одним запросом.
+
+Добавление — INSERT ... ON CONFLICT (столбцы) DO NOTHING RETURNING,
+удаление — DELETE ... RETURNING. Гонки одновременных запросов разрешает
+ограничение уникальности из ON CONFLICT: из двух одинаковых запросов
+строку добавит или удалит только один, второй получит пустой RETURNING и
+ответит ошибкой. Нарушение других ограничений не подавляется. Вместо
+сигналов save()/delete() моделей send_signal() отправляет post_save,
+post_delete и m2m_changed (post_add, post_remove) с теми же аргументами,
+что и ORM, поэтому кеши и события инвалидации работают как при работе
+через ORM.
+"""
+
+from django.db import connections, router
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.utils import timezone
+
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart, Subscribe
+
+INSERT_FAVORITE_SQL = """
+INSERT INTO {favorite} (user_id, recipe_id) VALUES (%s, %s)
+ON CONFLICT (user_id, recipe_id) DO NOTHING RETURNING id
+"""
+DELETE_FAVORITE_SQL = """
+DELETE FROM {favorite} WHERE user_id = %s AND recipe_id = %s RETURNING id
+"""
+# Корзина создается вместе с пользователем, рецепт добавляется по ее id
+# из подзапроса.
+INSERT_CART_RECIPE_SQL = """
+INSERT INTO {cart_recipe} (shoppingcart_id, recipe_id)
+SELECT id, %s FROM {cart} WHERE user_id = %s
+ON CONFLICT (shoppingcart_id, recipe_id) DO NOTHING
+RETURNING shoppingcart_id
+"""
+DELETE_CART_RECIPE_SQL = """
+DELETE FROM {cart_recipe}
+WHERE recipe_id = %s
+    AND shoppingcart_id IN (SELECT id FROM {cart} WHERE user_id = %s)
+RETURNING shoppingcart_id
+"""
+INSERT_CART_SQL = """
+INSERT INTO {cart} (user_id) VALUES (%s) ON CONFLICT (user_id) DO NOTHING
+"""
+INSERT_SUBSCRIBE_SQL = """
+INSERT INTO {subscribe} (user_id, author_id, created) VALUES (%s, %s, %s)
+ON CONFLICT (user_id, author_id) DO NOTHING RETURNING id
+"""
+DELETE_SUBSCRIBE_SQL = """
+DELETE FROM {subscribe} WHERE user_id = %s AND author_id = %s RETURNING id
+"""
+
+TABLES = {
+    'favorite': FavoriteRecipe,
+    'cart': ShoppingCart,
+    'cart_recipe': ShoppingCart.recipe.through,
+    'subscribe': Subscribe,
+}
+# Аргументы, которые ORM передает с сигналом помимо sender, instance
+# и using. Сигналы m2m_changed отправляются только от прямой связи.
+SIGNAL_ARGUMENTS = {
+    post_save: {'created': True, 'update_fields': None, 'raw': False},
+    post_delete: {},
+    m2m_changed: {'reverse': False},
+}
+
+
+def execute(model, sql, params):
+    """
+    Выполняет запрос в базе для записи model и возвращает первый столбец
+    строк RETURNING.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    sql = sql.format(
+        **{
+            name: connection.ops.quote_name(table._meta.db_table)
+            for name, table in TABLES.items()
+        }
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        if cursor.description is None:
+            return using, []
+        return using, [row[0] for row in cursor.fetchall()]
+
+
+def send_signal(signal, sender, using, **kwargs):
+    """
+    Отправляет сигнал изменения, сделанного запросом этого модуля, с
+    аргументами, как у ORM.
+    """
+    signal.send(
+        sender=sender, using=using, **{**SIGNAL_ARGUMENTS[signal], **kwargs}
+    )
+
+
+def add_favorite(user_id, recipe_id):
+    """Добавляет рецепт в избранное; False, если он уже там."""
+    using, rows = execute(
+        FavoriteRecipe, INSERT_FAVORITE_SQL, [user_id, recipe_id]
+    )
+    if not rows:
+        return False
+    favorite = FavoriteRecipe(id=rows[0], user_id=user_id, recipe_id=recipe_id)
+    send_signal(post_save, FavoriteRecipe, using, instance=favorite)
+    return True
+
+
+def remove_favorite(user_id, recipe_id):
+    """Удаляет рецепт из избранного; False, если его там не было."""
+    using, rows = execute(
+        FavoriteRecipe, DELETE_FAVORITE_SQL, [user_id, recipe_id]
+    )
+    if not rows:
+        return False
+    favorite = FavoriteRecipe(id=rows[0], user_id=user_id, recipe_id=recipe_id)
+    send_signal(post_delete, FavoriteRecipe, using, instance=favorite)
+    return True
+
+
+def cart_changed(action, using, cart_id, user_id, recipe_id):
+    send_signal(
+        m2m_changed,
+        ShoppingCart.recipe.through,
+        using,
+        instance=ShoppingCart(id=cart_id, user_id=user_id),
+        action=action,
+        model=Recipe,
+        pk_set={recipe_id},
+    )
+
+
+def add_to_cart(user_id, recipe_id):
+    """Добавляет рецепт в список покупок; False, если он уже там."""
+    using, rows = execute(
+        ShoppingCart, INSERT_CART_RECIPE_SQL, [recipe_id, user_id]
+    )
+    if not rows and not ShoppingCart.objects.filter(user_id=user_id).exists():
+        # Корзина пользователя, созданного до ее появления.
+        execute(ShoppingCart, INSERT_CART_SQL, [user_id])
+        using, rows = execute(
+            ShoppingCart, INSERT_CART_RECIPE_SQL, [recipe_id, user_id]
+        )
+    if not rows:
+        return False
+    cart_changed('post_add', using, rows[0], user_id, recipe_id)
+    return True
+
+
+def remove_from_cart(user_id, recipe_id):
+    """Удаляет рецепт из списка покупок; False, если его там не было."""
+    using, rows = execute(
+        ShoppingCart, DELETE_CART_RECIPE_SQL, [recipe_id, user_id]
+    )
+    if not rows:
+        return False
+    cart_changed('post_remove', using, rows[0], user_id, recipe_id)
+    return True
+
+
+def subscribe(user_id, author_id):
+    """Подписка на автора или None, если она уже есть."""
+    created = timezone.now()
+    value = Subscribe._meta.get_field('created').get_db_prep_value(
+        created, connections[router.db_for_write(Subscribe)]
+    )
+    using, rows = execute(
+        Subscribe, INSERT_SUBSCRIBE_SQL, [user_id, author_id, value]
+    )
+    if not rows:
+        return None
+    subscription = Subscribe(
+        id=rows[0], user_id=user_id, author_id=author_id, created=created
+    )
+    send_signal(post_save, Subscribe, using, instance=subscription)
+    return subscription
+
+
+def unsubscribe(user_id, author_id):
+    """Отменяет подписку на автора; False, если ее не было."""
+    using, rows = execute(
+        Subscribe, DELETE_SUBSCRIBE_SQL, [user_id, author_id]
+    )
+    if not rows:
+        return False
+    subscription = Subscribe(id=rows[0], user_id=user_id, author_id=author_id)
+    send_signal(post_delete, Subscribe, using, instance=subscription)
+    return True
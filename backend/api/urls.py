@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api import async_views
 from api.views import (
     CustomUserViewSet,
     IngredientViewSet,
@@ -17,7 +19,25 @@ router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.SERVER_INTERFACE == 'asgi':
+    # Асинхронные версии эндпоинтов, занятых вводом-выводом
+    urlpatterns += [
+        path('users/me/avatar/', async_views.avatar, name='avatar'),
+        path(
+            'recipes/download_shopping_cart/',
+            async_views.download_shopping_cart,
+            name='download-shopping-cart',
+        ),
+        path(
+            'recipes/<int:pk>/get-link/',
+            async_views.get_link,
+            name='get-link',
+        ),
+    ]
+
+urlpatterns += [
     # Управление подписками
     path(
         'users/<int:user_id>/subscribe/',
@@ -41,3 +61,6 @@ urlpatterns = [
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.AUTH_MODE == 'jwt':
+    urlpatterns.append(path('auth/', include('djoser.urls.jwt')))
@@ -1,7 +1,38 @@
 import csv
 
+from django.db.models import Sum
 from django.http import HttpResponse
 
+from foodgram.cache import get_generation, lists_namespace
+from . import constants
+from .cache import get_or_compute
+
+
+def get_shopping_list(user):
+    """
+    Ингредиенты из корзины пользователя с суммарным количеством.
+
+    Кешируется по поколениям рецептов и списков пользователя: первое
+    меняется при изменении каталога, второе — корзины. Одновременные
+    запросы вычисляют список один раз.
+    """
+
+    def compute():
+        return list(
+            user.shopping_cart.recipe.values(
+                'ingredients__name', 'ingredients__measurement_unit'
+            )
+            .annotate(amount=Sum('recipe__amount'))
+            .order_by()
+        )
+
+    key = 'shopping_list:{}:{}:{}'.format(
+        user.id,
+        get_generation('recipes'),
+        get_generation(lists_namespace(user.id)),
+    )
+    return get_or_compute(key, compute, constants.SHOPPING_LIST_CACHE_TIMEOUT)
+
 
 def generate_shopping_cart_csv(shopping_cart):
     """Генерация CSV файла со списком покупок."""
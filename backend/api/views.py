@@ -1,6 +1,10 @@
+from functools import partial
+
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import make_password
-from django.db.models import Count, Exists, OuterRef, Sum, Value
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Count, Exists, Max, OuterRef, Value
+from django.http import Http404, HttpRequest, QueryDict
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
@@ -10,28 +14,106 @@ from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
 from api.filters import IngredientFilter, RecipeFilter
-from recipes.models import Ingredient, Recipe, Subscribe, Tag
-from . import constants
-from .mixins import RecipeAccessMixin
+from foodgram.cache import get_generation
+from recipes.indexes import ingredient_index, recent_index, similarity_index
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    Subscribe,
+    Tag,
+)
+from recipes.versions import (
+    CATALOG_INGREDIENTS,
+    CATALOG_TAGS,
+    CATALOGS,
+    get_catalog_versions,
+)
+from . import constants, toggles
+from .documents import get_documents
+from .facets import get_facets, parse_facets
+from .fieldsets import EXPAND_PARAM, FIELDS_PARAM, parse_fieldset
+from .fragments import (
+    fragments_flight_key,
+    get_fragments,
+    is_missing,
+    lookup_fragments,
+    mark_missing,
+    personalize,
+    set_fragments,
+)
+from .cache import (
+    get_or_compute,
+    get_or_revalidate,
+    make_query_key,
+    single_flight,
+)
+from .conditional import latest, make_etag
+from .mixins import ConditionalGetMixin, RecipeAccessMixin
 from .pagination import PagePagination
+from .projections import RecipeProjection
 from .permissions import IsAuthorOrAdminOrReadOnly
 from .serializers import (
     CreateUserSerializer,
-    FavoriteRecipeSerializer,
     IngredientSerializer,
+    PantryQuerySerializer,
     RecipeCreateUpdateSerializer,
     RecipeReadSerializer,
     RecipeShortSerializer,
     SetAvatarSerializer,
-    ShoppingCartSerializer,
     SubscriptionSerializer,
     TagSerializer,
     UserSerializer,
 )
-from .utils import create_short_link, generate_shopping_cart_csv
+from .utils import (
+    create_short_link,
+    generate_shopping_cart_csv,
+    get_shopping_list,
+)
 
 User = get_user_model()
 
+# Столбцы рецепта, от которых зависит ETag: все изменения содержимого
+# отражаются в updated_at, остальное — флаги текущего пользователя.
+VALIDATOR_COLUMNS = (
+    'id',
+    'updated_at',
+    'is_favorited',
+    'is_in_shopping_cart',
+    'is_subscribed',
+)
+# Параметры запроса, с которыми список строится по индексу последних
+# рецептов (не больше одного тега).
+RECENT_LIST_PARAMS = {'page', 'limit', 'tags', FIELDS_PARAM, EXPAND_PARAM}
+
+
+class DetachedRequest(HttpRequest):
+    """
+    Анонимный GET-запрос, снятый с исходного: строка запроса, путь, хост,
+    схема и заголовок Accept. Не ссылается на исходный запрос и его
+    пользователя, поэтому его можно передать в фоновый поток.
+    """
+
+    def __init__(self, request):
+        super().__init__()
+        self.method = 'GET'
+        self.path = request.path
+        self.path_info = request.path_info
+        query_string = request.META.get('QUERY_STRING', '')
+        self.GET = QueryDict(query_string)
+        self.META = {
+            'QUERY_STRING': query_string,
+            'HTTP_HOST': request.get_host(),
+            'SERVER_PORT': request.get_port(),
+        }
+        if 'HTTP_ACCEPT' in request.META:
+            self.META['HTTP_ACCEPT'] = request.META['HTTP_ACCEPT']
+        self.user = AnonymousUser()
+        self._scheme = request.scheme
+
+    def _get_scheme(self):
+        return self._scheme
+
 
 class SubscriptionView(generics.CreateAPIView, generics.DestroyAPIView):
     """Представление для подписки и отписки от пользователя."""
@@ -39,10 +121,16 @@ class SubscriptionView(generics.CreateAPIView, generics.DestroyAPIView):
     permission_classes = (IsAuthenticated,)
     serializer_class = SubscriptionSerializer
 
+    def get_author_id(self):
+        """user_id из адреса; 404, если это не число."""
+        try:
+            return int(self.kwargs.get('user_id'))
+        except (TypeError, ValueError):
+            raise Http404
+
     def get_author(self):
         """Получение автора по user_id."""
-        author_id = self.kwargs.get('user_id')
-        return get_object_or_404(User, id=author_id)
+        return get_object_or_404(User, id=self.get_author_id())
 
     def create(self, request, *args, **kwargs):
         author = self.get_author()
@@ -52,32 +140,25 @@ class SubscriptionView(generics.CreateAPIView, generics.DestroyAPIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        if request.user.follower.filter(author=author).exists():
+        subscription = toggles.subscribe(request.user.id, author.id)
+        if subscription is None:
             return Response(
                 {'errors': constants.ERROR_ALREADY_SUBSCRIBED},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        subscription = Subscribe.objects.create(
-            user=request.user, author=author
-        )
-
+        subscription.author = author
         serializer = self.get_serializer(subscription)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, *args, **kwargs):
-        author = self.get_object()
-        subscription = Subscribe.objects.filter(
-            user=request.user, author=author
-        )
-
-        if not subscription.exists():
+        if not toggles.unsubscribe(request.user.id, self.get_author_id()):
+            # Автор проверяется, только если подписки не было.
+            self.get_object()
             return Response(
                 {'errors': 'Вы не подписаны на этого пользователя'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        subscription.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def get_object(self):
@@ -98,7 +179,22 @@ class CustomUserViewSet(UserViewSet):
             return [AllowAny()]
         return [IsAuthenticated()]
 
+    def get_fields(self):
+        """Поля пользователя из ?fields= при чтении, иначе None."""
+        if (
+            self.action not in ('list', 'retrieve', 'me')
+            or self.request.method not in SAFE_METHODS
+        ):
+            return None
+        fields, _ = parse_fieldset(
+            self.request.query_params, constants.USER_FIELDS
+        )
+        return fields
+
     def get_queryset(self):
+        fields = self.get_fields()
+        if fields is not None and 'is_subscribed' not in fields:
+            return User.objects.all()
         if self.request.user.is_authenticated:
             return User.objects.annotate(
                 is_subscribed=Exists(
@@ -107,6 +203,12 @@ class CustomUserViewSet(UserViewSet):
             ).prefetch_related('follower', 'following')
         return User.objects.annotate(is_subscribed=Value(False))
 
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
     def get_serializer_class(self):
         if self.action == 'create':
             return CreateUserSerializer
@@ -118,6 +220,17 @@ class CustomUserViewSet(UserViewSet):
         password = make_password(self.request.data['password'])
         serializer.save(password=password)
 
+    def get_subscriptions(self):
+        """Подписки текущего пользователя с числом рецептов авторов."""
+        return (
+            Subscribe.objects.filter(user=self.request.user)
+            .select_related(
+                'author',
+            )
+            .annotate(recipes_count=Count('author__recipe'))
+            .order_by('id')
+        )
+
     @action(
         detail=False,
         methods=['get'],
@@ -127,15 +240,7 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         """Получение списка подписок текущего пользователя."""
-        queryset = (
-            Subscribe.objects.filter(user=request.user)
-            .select_related(
-                'author',
-            )
-            .annotate(recipes_count=Count('author__recipe'))
-            .order_by('id')
-        )
-
+        queryset = self.get_subscriptions()
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(
@@ -158,12 +263,14 @@ class CustomUserViewSet(UserViewSet):
         serializer = SetAvatarSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        # Удаляем старый аватар, если он существует
+        # Удаляем старый аватар, если он существует. Пользователь может
+        # быть взят из кеша аутентификации и устареть, поэтому
+        # сохраняется только аватар.
         if request.user.avatar:
-            request.user.avatar.delete()
+            request.user.avatar.delete(save=False)
 
         request.user.avatar = serializer.validated_data['avatar']
-        request.user.save()
+        request.user.save(update_fields=['avatar'])
 
         return Response(
             {'avatar': request.build_absolute_uri(request.user.avatar.url)},
@@ -178,12 +285,12 @@ class CustomUserViewSet(UserViewSet):
     def delete_avatar(self, request):
         """Удаление аватара пользователя."""
         if request.user.avatar:
-            request.user.avatar.delete()
-            request.user.save()
+            request.user.avatar.delete(save=False)
+            request.user.save(update_fields=['avatar'])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     Представление для управления рецептами.
 
@@ -214,19 +321,313 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     )
                 ),
                 is_in_shopping_cart=Exists(
-                    self.request.user.shopping_cart.recipe.filter(
-                        id=OuterRef('id')
+                    ShoppingCart.objects.filter(
+                        user=self.request.user, recipe=OuterRef('id')
+                    )
+                ),
+                is_subscribed=Exists(
+                    Subscribe.objects.filter(
+                        user=self.request.user, author=OuterRef('author_id')
                     )
                 ),
             )
         else:
             queryset = queryset.annotate(
-                is_in_shopping_cart=Value(False), is_favorited=Value(False)
+                is_in_shopping_cart=Value(False),
+                is_favorited=Value(False),
+                is_subscribed=Value(False),
             )
         return queryset
 
+    def get_projection(self):
+        """Проекция рецептов с полями из ?fields= и ?expand=."""
+        fields, expand = parse_fieldset(
+            self.request.query_params,
+            constants.RECIPE_FIELDS,
+            constants.RECIPE_EXPANDABLE_FIELDS,
+        )
+        return RecipeProjection(self.request, fields, expand)
+
+    def recipes_etag(self, rows, versions, *extra):
+        """
+        ETag рецептов по узким строкам (id, дата изменения, флаги
+        пользователя) и версиям справочников, без сериализации.
+        """
+        return make_etag(
+            rows,
+            [version for version, _ in versions.values()],
+            self.request.get_host(),
+            self.request.get_full_path(),
+            self.request.accepted_renderer.format,
+            *extra,
+        )
+
+    def build_fragments(self, queryset, recipe_ids):
+        """
+        Публичные фрагменты рецептов {id: данные} из базы: сохраненные
+        документы рецептов, а для рецептов без документа — проекция.
+        """
+        fragments = get_documents(recipe_ids, using=queryset.db)
+        recipe_ids = [
+            recipe_id for recipe_id in recipe_ids if recipe_id not in fragments
+        ]
+        if not recipe_ids:
+            return fragments
+        projection = RecipeProjection(self.request, public=True)
+        if len(recipe_ids) == 1:
+            data = projection.retrieve(queryset, recipe_ids[0])
+            if data is not None:
+                fragments[data['id']] = data
+            return fragments
+        values = projection.values(queryset.filter(id__in=recipe_ids))
+        fragments.update(
+            (data['id'], data) for data in projection.serialize(values)
+        )
+        return fragments
+
+    def store_fragments(self, queryset, rows, versions):
+        """Строит недостающие фрагменты и сохраняет их в кеш."""
+        fragments = self.build_fragments(queryset, [row[0] for row in rows])
+        set_fragments(rows, versions, fragments)
+        return fragments
+
+    def render_recipes(self, projection, queryset, rows, versions):
+        """
+        Представления рецептов по узким строкам rows в их порядке.
+
+        Полные представления собираются из кеша публичных фрагментов с
+        флагами пользователя из rows; в базу идут только недостающие
+        фрагменты. Выборочные поля строятся проекцией напрямую.
+        """
+        if not projection.is_complete:
+            positions = {row[0]: index for index, row in enumerate(rows)}
+            values = sorted(
+                projection.values(
+                    queryset.filter(id__in=list(positions)).order_by()
+                ),
+                key=lambda row: positions[row[0]],
+            )
+            return projection.serialize(values)
+
+        fragments = get_fragments(rows, versions)
+        missing = [row for row in rows if row[0] not in fragments]
+        if missing:
+            fragments.update(
+                single_flight(
+                    fragments_flight_key([row[0] for row in missing]),
+                    partial(self.store_fragments, queryset, missing, versions),
+                    partial(lookup_fragments, missing, versions),
+                )
+            )
+        return [
+            personalize(self.request, fragments[row[0]], *row[2:])
+            for row in rows
+            if row[0] in fragments
+        ]
+
+    def render_ranked(self, ranked, field):
+        """
+        Представления рецептов [(id, оценка)] в их порядке с оценкой в
+        поле field. Рецепты строятся из кеша фрагментов, как в списке.
+        """
+        scores = dict(ranked)
+        positions = {
+            recipe_id: index for index, recipe_id in enumerate(scores)
+        }
+        queryset = self.get_queryset()
+        rows = sorted(
+            queryset.filter(id__in=list(scores))
+            .order_by()
+            .values_list(*VALIDATOR_COLUMNS),
+            key=lambda row: positions[row[0]],
+        )
+        data = self.render_recipes(
+            RecipeProjection(self.request),
+            queryset,
+            rows,
+            get_catalog_versions(*CATALOGS),
+        )
+        for recipe in data:
+            recipe[field] = scores[recipe['id']]
+        return data
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список рецептов, при ?facets= — со счетчиками фасетов.
+
+        Анонимные страницы целиком кешируются по нормализованной строке
+        запроса и поколению рецептов; устаревшая страница отдается, пока
+        в фоне строится новая.
+        """
+        if request.user.is_authenticated:
+            return self.list_page()
+        key = make_query_key(
+            'recipes:list',
+            request.query_params,
+            extra=[request.build_absolute_uri('/')],
+        )
+        etag, data = get_or_revalidate(
+            key,
+            get_generation('recipes'),
+            partial(self.anonymous_page, DetachedRequest(request)),
+            constants.RECIPE_LIST_CACHE_TIMEOUT,
+            constants.RECIPE_LIST_STALE_TIMEOUT,
+        )
+        not_modified = self.not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+        return Response(data)
+
+    def anonymous_page(self, http_request):
+        """
+        ETag и данные страницы для кеша по снимку запроса. Строятся
+        отдельным экземпляром представления, так как могут вычисляться
+        в фоновом потоке.
+        """
+        view = type(self)(
+            action_map=self.action_map,
+            format_kwarg=self.format_kwarg,
+            args=self.args,
+            kwargs=self.kwargs,
+        )
+        view.request = view.initialize_request(http_request)
+        view.request.user = http_request.user
+        (
+            view.request.accepted_renderer,
+            view.request.accepted_media_type,
+        ) = view.perform_content_negotiation(view.request)
+        response = view.list_page(conditional=False)
+        etag, _ = view.validators
+        return etag, response.data
+
+    def paginate_recent(self):
+        """
+        Первые страницы списка без фильтров или с одним тегом по индексу
+        последних рецептов. База только дополняет id флагами пользователя.
+        None, если запрос индексу не подходит.
+        """
+        params = self.request.query_params
+        if (
+            self.paginator is None
+            or not params.keys() <= RECENT_LIST_PARAMS
+            or len(params.getlist('tags')) > 1
+        ):
+            return None
+        ids, count = recent_index.first(params.get('tags'))
+        page_ids = self.paginator.paginate_ids(ids, count, self.request)
+        if page_ids is None:
+            return None
+        positions = {
+            recipe_id: index for index, recipe_id in enumerate(page_ids)
+        }
+        rows = self.get_queryset().filter(id__in=page_ids).order_by()
+        return sorted(
+            rows.values_list(*VALIDATOR_COLUMNS),
+            key=lambda row: positions[row[0]],
+        )
+
+    def list_page(self, conditional=True):
+        """Страница списка рецептов; при conditional — с ответом 304."""
+        request = self.request
+        facets = parse_facets(request.query_params.get('facets', ''))
+        projection = self.get_projection()
+        rows = self.paginate_recent()
+        paginated = rows is not None
+        if paginated:
+            queryset = self.get_queryset()
+        else:
+            queryset = self.filter_queryset(self.get_queryset())
+            validators = queryset.values_list(*VALIDATOR_COLUMNS)
+            rows = self.paginate_queryset(validators)
+            paginated = rows is not None
+            if not paginated:
+                rows = list(validators)
+        extra = []
+        if paginated:
+            extra.append(self.paginator.page.paginator.count)
+        if facets:
+            extra.append(
+                queryset.aggregate(
+                    count=Count('id'), updated_at=Max('updated_at')
+                )
+            )
+        versions = get_catalog_versions(*CATALOGS)
+        not_modified = self.not_modified(
+            self.recipes_etag(rows, versions, *extra)
+        )
+        if conditional and not_modified is not None:
+            return not_modified
+
+        data = self.render_recipes(projection, queryset, rows, versions)
+        if paginated:
+            response = self.get_paginated_response(data)
+        else:
+            response = Response(data)
+        if facets:
+            response.data['facets'] = get_facets(
+                request, self.filter_queryset(self.get_queryset()), facets
+            )
+        return response
+
+    def get_recipe_id(self):
+        """pk из адреса; 404, если это не число."""
+        try:
+            return int(self.kwargs['pk'])
+        except (TypeError, ValueError):
+            raise Http404
+
+    def get_short_recipe(self):
+        """Рецепт со столбцами RecipeShortSerializer одним запросом."""
+        return get_object_or_404(
+            Recipe.objects.only(*RecipeShortSerializer.Meta.fields),
+            pk=self.get_recipe_id(),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        projection = self.get_projection()
+        queryset = self.filter_queryset(self.get_queryset())
+        recipe_id = self.get_recipe_id()
+        # Отсутствие рецепта запоминается только без фильтров в запросе:
+        # с ними рецепт может существовать, но не подходить под условия.
+        cacheable = not request.query_params
+        if cacheable and is_missing(recipe_id):
+            raise Http404
+        row = (
+            queryset.filter(pk=recipe_id)
+            .values_list(*VALIDATOR_COLUMNS)
+            .first()
+        )
+        if row is None:
+            if cacheable:
+                mark_missing(recipe_id)
+            raise Http404
+        versions = get_catalog_versions(*CATALOGS)
+        # Флаги пользователя не отражаются в датах изменения, поэтому
+        # Last-Modified отдается только анонимным пользователям.
+        last_modified = None
+        if not request.user.is_authenticated:
+            last_modified = latest(
+                row[1], *(updated_at for _, updated_at in versions.values())
+            )
+        not_modified = self.not_modified(
+            self.recipes_etag([row], versions), last_modified
+        )
+        if not_modified is not None:
+            return not_modified
+
+        data = self.render_recipes(projection, queryset, [row], versions)
+        if not data:
+            raise Http404
+        return Response(data[0])
+
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'get_link']:
+        if self.action in [
+            'list',
+            'retrieve',
+            'get_link',
+            'pantry',
+            'similar',
+        ]:
             permission_classes = [permissions.AllowAny]
         elif self.action == 'create':
             permission_classes = [permissions.IsAuthenticated]
@@ -275,6 +676,60 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[AllowAny],
+    )
+    def pantry(self, request):
+        """
+        Подбор рецептов по ингредиентам, которые есть у пользователя.
+
+        Сначала идут рецепты, которые можно приготовить целиком, затем
+        рецепты, где не хватает одного или двух ингредиентов.
+        """
+        params = PantryQuerySerializer(
+            data={
+                'ingredients': request.query_params.getlist('ingredients'),
+                'max_missing': request.query_params.get(
+                    'max_missing', constants.MAX_PANTRY_MISSING
+                ),
+            }
+        )
+        params.is_valid(raise_exception=True)
+        ranked = ingredient_index.match(
+            params.validated_data['ingredients'],
+            params.validated_data['max_missing'],
+        )
+
+        page = self.paginate_queryset(ranked)
+        return self.get_paginated_response(
+            self.render_ranked(page, 'missing_ingredients')
+        )
+
+    @action(
+        detail=True,
+        methods=['get'],
+        permission_classes=[AllowAny],
+    )
+    def similar(self, request, pk=None):
+        """Рецепты с похожим набором ингредиентов."""
+        recipe = self.get_short_recipe()
+        ranked = similarity_index.similar(
+            recipe.id, constants.MIN_RECIPE_SIMILARITY
+        )
+
+        page = self.paginate_queryset(ranked)
+        return self.get_paginated_response(
+            self.render_ranked(
+                [
+                    (recipe_id, round(similarity, 2))
+                    for recipe_id, similarity in page
+                ],
+                'similarity',
+            )
+        )
+
     @action(
         detail=False,
         methods=['get'],
@@ -284,14 +739,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         Представление для скачивания списка покупок в формате CSV.
         """
-        shopping_cart = (
-            request.user.shopping_cart.recipe.values(
-                'ingredients__name', 'ingredients__measurement_unit'
-            )
-            .annotate(amount=Sum('recipe__amount'))
-            .order_by()
-        )
-        return generate_shopping_cart_csv(shopping_cart)
+        return generate_shopping_cart_csv(get_shopping_list(request.user))
 
     @action(
         detail=True,
@@ -301,14 +749,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def favorite(self, request, pk=None):
         """Добавление/удаление рецепта в избранное."""
-        recipe = self.get_object()
-
         if request.method == 'POST':
-            serializer = FavoriteRecipeSerializer(
-                data={'recipe': recipe.id}, context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save(user=request.user)
+            recipe = self.get_short_recipe()
+            if not toggles.add_favorite(request.user.id, recipe.id):
+                # Тело ошибки как у прежней проверки в сериализаторе.
+                return Response(
+                    {'errors': [constants.ERROR_RECIPE_ALREADY_FAVORITED]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
             response_serializer = RecipeShortSerializer(
                 recipe, context={'request': request}
@@ -317,14 +765,12 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 response_serializer.data, status=status.HTTP_201_CREATED
             )
 
-        favorite = request.user.favorite_recipes.filter(recipe=recipe)
-        if not favorite.exists():
+        if not toggles.remove_favorite(request.user.id, self.get_recipe_id()):
+            self.get_short_recipe()
             return Response(
                 {'errors': 'Рецепт не находится в избранном'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        favorite.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -335,14 +781,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def shopping_cart(self, request, pk=None):
         """Добавление/удаление рецепта в список покупок."""
-        recipe = self.get_object()
-
         if request.method == 'POST':
-            serializer = ShoppingCartSerializer(
-                data={'recipe': recipe.id}, context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
+            recipe = self.get_short_recipe()
+            if not toggles.add_to_cart(request.user.id, recipe.id):
+                # Тело ошибки как у прежней проверки в сериализаторе.
+                return Response(
+                    {'errors': [constants.RECIPE_ALREADY_IN_CART]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
             response_serializer = RecipeShortSerializer(
                 recipe, context={'request': request}
@@ -351,30 +797,39 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 response_serializer.data, status=status.HTTP_201_CREATED
             )
 
-        shopping_cart = request.user.shopping_cart
-        if not shopping_cart.recipe.filter(id=recipe.id).exists():
+        if not toggles.remove_from_cart(request.user.id, self.get_recipe_id()):
+            self.get_short_recipe()
             return Response(
                 {'errors': 'Рецепт не находится в списке покупок'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        shopping_cart.recipe.remove(recipe)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(RecipeAccessMixin, viewsets.ModelViewSet):
+class TagViewSet(
+    ConditionalGetMixin, RecipeAccessMixin, viewsets.ModelViewSet
+):
     """Список тэгов."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
     def list(self, request, *args, **kwargs):
+        not_modified = self.catalog_not_modified(CATALOG_TAGS)
+        if not_modified is not None:
+            return not_modified
         queryset = self.get_queryset()
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    def retrieve(self, request, *args, **kwargs):
+        not_modified = self.catalog_not_modified(CATALOG_TAGS)
+        if not_modified is not None:
+            return not_modified
+        return super().retrieve(request, *args, **kwargs)
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     Представление для управления ингредиентами.
     """
@@ -386,3 +841,29 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     search_fields = ('^name',)
     pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        not_modified = self.catalog_not_modified(
+            CATALOG_INGREDIENTS
+        )
+        if not_modified is not None:
+            return not_modified
+        etag, _ = self.validators
+        data = get_or_compute(
+            f'ingredients:{etag}',
+            self.list_data,
+            constants.INGREDIENTS_CACHE_TIMEOUT,
+        )
+        return Response(data)
+
+    def list_data(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.get_serializer(queryset, many=True).data
+
+    def retrieve(self, request, *args, **kwargs):
+        not_modified = self.catalog_not_modified(
+            CATALOG_INGREDIENTS
+        )
+        if not_modified is not None:
+            return not_modified
+        return super().retrieve(request, *args, **kwargs)
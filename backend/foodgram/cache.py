@@ -0,0 +1,359 @@
+"""
+Двухуровневый кеш: небольшой LRU в памяти процесса (L1) перед общим
+для всех воркеров бэкендом (L2).
+
+Чтение сначала идет в L1, при промахе — в L2, и найденное значение
+попадает в L1 на время не больше L1_TIMEOUT секунд. Так изменения,
+сделанные другими воркерами в L2, становятся видны с ограниченной
+задержкой. Запись и удаление выполняются в обоих уровнях, время жизни
+задается для каждого ключа отдельно.
+
+Пространства имен (recipes, tags, ingredients, users, lists) имеют
+версию в L2: bump() делает устаревшими сразу все ключи пространства.
+Версия хранится без срока жизни, а новая начинается с текущего времени
+в миллисекундах: если общий кеш вытеснит ключ версии, она не вернется к
+значению, под которым еще лежат старые записи.
+Пространство вида «имя:ключ» (lists:{id пользователя}) — отдельный
+экземпляр пространства имя со своей версией.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+NAMESPACE_KEY = 'namespace:{name}'
+# Избранное и список покупок пользователя
+LISTS_NAMESPACE = 'lists:{user_id}'
+
+_missing = object()
+
+# L1 по псевдонимам общего кеша: Django создает экземпляр бэкенда на
+# каждый поток, а L1 и статистика должны быть общими для процесса.
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class LRUCache:
+    """
+    Ограниченный по размеру LRU-кеш в памяти процесса с временем жизни
+    записей. Потокобезопасен.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        expires = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_if(self, predicate):
+        """Удаляет записи, для значений которых predicate истинен."""
+        with self._lock:
+            for key in [
+                key
+                for key, (_, value) in self._data.items()
+                if predicate(value)
+            ]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalTier:
+    """L1 процесса и его статистика."""
+
+    def __init__(self, max_size, timeout):
+        self.cache = LRUCache(max_size, timeout)
+        self.lock = threading.Lock()
+        self.stats = dict.fromkeys(('l1_hits', 'l2_hits', 'misses'), 0)
+
+
+def get_local_tier(name, max_size, timeout):
+    with _local_tiers_lock:
+        tier = _local_tiers.get(name)
+        if tier is None:
+            tier = _local_tiers[name] = LocalTier(max_size, timeout)
+        return tier
+
+
+class Namespace:
+    """
+    Пространство имен ключей с общей версией. Версия хранится в кеше,
+    поэтому bump() в одном воркере видят все остальные.
+    """
+
+    def __init__(self, cache, name):
+        self.cache = cache
+        self.name = name
+        self.version_key = NAMESPACE_KEY.format(name=name)
+
+    @staticmethod
+    def initial_version():
+        return time.time_ns() // 1_000_000
+
+    def version(self):
+        version = self.cache.get(self.version_key)
+        if version is None:
+            version = self.initial_version()
+            self.cache.add(self.version_key, version, None)
+            version = self.cache.get(self.version_key, version)
+        return version
+
+    def bump(self):
+        try:
+            version = self.cache.incr(self.version_key)
+        except ValueError:
+            self.cache.add(self.version_key, self.initial_version(), None)
+            version = self.cache.incr(self.version_key)
+        # BaseCache.incr() (у файлового кеша и других бэкендов без
+        # своего incr) перезаписывает ключ со сроком по умолчанию.
+        self.cache.touch(self.version_key, None)
+        return version
+
+    def make_key(self, key):
+        return f'{self.name}:{key}'
+
+    def get(self, key, default=None):
+        return self.cache.get(
+            self.make_key(key), default, version=self.version()
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.cache.set(
+            self.make_key(key), value, timeout, version=self.version()
+        )
+
+    def delete(self, key):
+        return self.cache.delete(self.make_key(key), version=self.version())
+
+
+class TieredCache(BaseCache):
+    """
+    Бэкенд кеша Django с уровнями L1 (память процесса) и L2 (общий кеш
+    из CACHES, OPTIONS['L2']).
+
+    OPTIONS:
+        L2: псевдоним общего кеша в CACHES;
+        L1_MAX_SIZE: число записей в L1;
+        L1_TIMEOUT: наибольшее время жизни записи в L1, сек.;
+        NAMESPACES: допустимые пространства имен.
+    """
+
+    def __init__(self, location, params):
+        options = params.get('OPTIONS', {})
+        super().__init__(
+            {
+                **params,
+                'OPTIONS': {
+                    name: value
+                    for name, value in options.items()
+                    if name in ('MAX_ENTRIES', 'CULL_FREQUENCY')
+                },
+            }
+        )
+        self.l2_alias = options.get('L2', 'shared')
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.local = get_local_tier(
+            self.l2_alias, options.get('L1_MAX_SIZE', 1000), self.l1_timeout
+        )
+        self.l1 = self.local.cache
+        self.namespaces = {
+            name: Namespace(self, name)
+            for name in options.get('NAMESPACES', ())
+        }
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    def namespace(self, name):
+        """
+        Пространство имен из OPTIONS['NAMESPACES'] или его экземпляр
+        вида «имя:ключ».
+        """
+        namespace = self.namespaces.get(name)
+        if namespace is not None:
+            return namespace
+        base, separator, _ = name.partition(':')
+        if separator and base in self.namespaces:
+            return Namespace(self, name)
+        raise ValueError(f'Неизвестное пространство имен кеша: {name}')
+
+    def _count(self, name, value=1):
+        with self.local.lock:
+            self.local.stats[name] += value
+
+    def stats(self):
+        """Попадания и промахи процесса по уровням."""
+        with self.local.lock:
+            stats = dict(self.local.stats)
+        total = sum(stats.values())
+        stats['hit_ratio'] = (
+            (stats['l1_hits'] + stats['l2_hits']) / total if total else 0.0
+        )
+        stats['l1_size'] = len(self.l1)
+        return stats
+
+    def _l1_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.l1_timeout
+        return min(timeout, self.l1_timeout)
+
+    def _l1_set(self, key, value, timeout):
+        timeout = self._l1_timeout(timeout)
+        if timeout <= 0:
+            self.l1.delete(key)
+            return
+        self.l1.set(
+            key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), timeout
+        )
+
+    def _l1_get(self, key):
+        value = self.l1.get(key, _missing)
+        if value is _missing:
+            return _missing
+        return pickle.loads(value)
+
+    def get(self, key, default=None, version=None):
+        l1_key = self.make_key(key, version)
+        value = self._l1_get(l1_key)
+        if value is not _missing:
+            self._count('l1_hits')
+            return value
+        value = self.l2.get(key, _missing, version=version)
+        if value is _missing:
+            self._count('misses')
+            return default
+        self._count('l2_hits')
+        self._l1_set(l1_key, value, None)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        rest = []
+        for key in keys:
+            value = self._l1_get(self.make_key(key, version))
+            if value is _missing:
+                rest.append(key)
+            else:
+                found[key] = value
+        self._count('l1_hits', len(found))
+        if rest:
+            from_l2 = self.l2.get_many(rest, version=version)
+            self._count('l2_hits', len(from_l2))
+            self._count('misses', len(rest) - len(from_l2))
+            for key, value in from_l2.items():
+                self._l1_set(self.make_key(key, version), value, None)
+            found.update(from_l2)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        self._l1_set(self.make_key(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._l1_set(self.make_key(key, version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._l1_set(self.make_key(key, version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l1.delete(self.make_key(key, version))
+        return self.l2.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self.l1.delete(self.make_key(key, version))
+        return self.l2.incr(key, delta, version=version)
+
+    def has_key(self, key, version=None):
+        if self._l1_get(self.make_key(key, version)) is not _missing:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def delete(self, key, version=None):
+        self.l1.delete(self.make_key(key, version))
+        return self.l2.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.l1.delete(self.make_key(key, version))
+        self.l2.delete_many(keys, version=version)
+
+    def forget(self, keys, version=None):
+        """
+        Удаляет ключи только из L1 этого процесса, чтобы следующее чтение
+        взяло их из L2.
+        """
+        for key in keys:
+            self.l1.delete(self.make_key(key, version))
+
+    def clear_local(self):
+        """Очищает только L1 этого процесса."""
+        self.l1.clear()
+
+    def clear(self):
+        self.l1.clear()
+        self.l2.clear()
+
+
+def get_generation(namespace):
+    """Текущее поколение (версия) пространства имен кеша."""
+    return cache.namespace(namespace).version()
+
+
+def bump_generation(namespace):
+    """
+    Увеличивает поколение пространства имен, делая устаревшими все
+    ключи, построенные на предыдущем поколении.
+    """
+    return cache.namespace(namespace).bump()
+
+
+def lists_namespace(user_id):
+    """
+    Пространство имен избранного и списка покупок пользователя: их
+    изменения не затрагивают кеши каталога рецептов.
+    """
+    return LISTS_NAMESPACE.format(user_id=user_id)
@@ -0,0 +1,159 @@
+"""
+Маршрутизация запросов к базе: чтение — на реплики, запись — на основную.
+
+На реплики уходят только чтения моделей приложений recipes и users внутри
+безопасных (GET, HEAD, OPTIONS) HTTP-запросов. После записи клиент на
+короткое время закрепляется за основной базой, чтобы сразу видеть свои
+изменения, несмотря на задержку репликации.
+
+Недоступная реплика пропускается: ее доступность процесс проверяет не
+чаще раза в DATABASE_REPLICA_CHECK_SECONDS, а если недоступны все,
+чтение идет в основную базу.
+"""
+
+import hashlib
+import itertools
+import logging
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY = 'default'
+PIN_KEY = 'db:pin:{client}'
+# Cookie анонимного клиента, закрепленного за основной базой
+PIN_COOKIE = 'db_pin'
+
+logger = logging.getLogger(__name__)
+
+_use_replicas = ContextVar('use_replicas', default=False)
+
+
+def check_replica(alias):
+    """Открывается ли соединение с репликой и отвечает ли она на запрос."""
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        logger.warning('Реплика %s недоступна', alias, exc_info=True)
+        try:
+            connection.close()
+        except DatabaseError:
+            pass
+        return False
+    return True
+
+
+class ReplicaRouter:
+    """
+    Роутер, распределяющий чтения по доступным репликам по кругу.
+    Результат проверки реплики общий для потоков процесса.
+    """
+
+    route_app_labels = {'recipes', 'users'}
+
+    def __init__(self):
+        self._replicas = itertools.cycle(settings.DATABASE_REPLICAS or [None])
+        self._lock = threading.Lock()
+        # Псевдоним реплики: (время следующей проверки, доступна ли)
+        self._health = {}
+
+    def db_for_read(self, model, **hints):
+        if (
+            not settings.DATABASE_REPLICAS
+            or model._meta.app_label not in self.route_app_labels
+            or not _use_replicas.get()
+        ):
+            return PRIMARY
+        for _ in settings.DATABASE_REPLICAS:
+            with self._lock:
+                alias = next(self._replicas)
+            if self.is_available(alias):
+                return alias
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+    def is_available(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            checked = self._health.get(alias)
+        if checked is not None and checked[0] > now:
+            return checked[1]
+        available = check_replica(alias)
+        with self._lock:
+            self._health[alias] = (
+                now + settings.DATABASE_REPLICA_CHECK_SECONDS,
+                available,
+            )
+        return available
+
+
+def pin_key(client):
+    return PIN_KEY.format(client=hashlib.sha256(client.encode()).hexdigest())
+
+
+def get_client(request):
+    """
+    Клиент для закрепления за основной базой: заголовок Authorization или
+    cookie анонимного клиента. Адрес клиента не подходит: за nginx он у
+    всех один. None — клиент еще не закреплялся.
+    """
+    return request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(
+        PIN_COOKIE
+    )
+
+
+class PrimaryPinningMiddleware(MiddlewareMixin):
+    """
+    Разрешает чтение с реплик для безопасных запросов и закрепляет
+    клиента за основной базой на DATABASE_PRIMARY_PIN_SECONDS секунд
+    после успешного изменяющего запроса. Анонимный клиент для этого
+    получает cookie со случайным идентификатором.
+    """
+
+    def process_request(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return
+        client = get_client(request)
+        request.db_pin_key = pin_key(client) if client else None
+        _use_replicas.set(
+            request.method in SAFE_METHODS
+            and not (client and cache.get(request.db_pin_key))
+        )
+
+    def process_response(self, request, response):
+        if not hasattr(request, 'db_pin_key'):
+            return response
+        _use_replicas.set(False)
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return response
+        key = request.db_pin_key
+        if key is None:
+            client = secrets.token_urlsafe()
+            response.set_cookie(
+                PIN_COOKIE,
+                client,
+                max_age=settings.DATABASE_PRIMARY_PIN_SECONDS,
+                secure=request.is_secure(),
+                httponly=True,
+                samesite='Lax',
+            )
+            key = pin_key(client)
+        cache.set(key, True, settings.DATABASE_PRIMARY_PIN_SECONDS)
+        return response
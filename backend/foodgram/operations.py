@@ -0,0 +1,104 @@
+"""
+Операции миграций для индексов, которые строятся без блокировки записи.
+
+На PostgreSQL индексы создаются и удаляются с CONCURRENTLY, поэтому
+миграции с этими операциями должны быть неатомарными (atomic = False).
+На остальных базах (SQLite в разработке) выполняется обычный DDL.
+"""
+
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently as PostgresAddIndexConcurrently,
+)
+from django.db.migrations.operations import AddIndex
+from django.db.migrations.operations.base import Operation
+
+
+def is_postgresql(schema_editor):
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+class AddIndexConcurrently(PostgresAddIndexConcurrently):
+    """AddIndex, который на PostgreSQL строит индекс CONCURRENTLY."""
+
+    def database_forwards(
+        self, app_label, schema_editor, from_state, to_state
+    ):
+        if is_postgresql(schema_editor):
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        else:
+            AddIndex.database_forwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(
+        self, app_label, schema_editor, from_state, to_state
+    ):
+        if is_postgresql(schema_editor):
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+        else:
+            AddIndex.database_backwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+
+
+class CreateIndexConcurrently(Operation):
+    """
+    Индекс, который нельзя описать в Meta.indexes: по таблице связей
+    ManyToManyField или по выражению с классом операторов. Состояние
+    моделей не меняется.
+
+    columns — выражение для PostgreSQL, sqlite_columns — для остальных
+    баз (по умолчанию то же самое).
+    """
+
+    reduces_to_sql = True
+    reversible = True
+
+    def __init__(self, name, table, columns, sqlite_columns=None):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.sqlite_columns = sqlite_columns or columns
+
+    def deconstruct(self):
+        kwargs = {
+            'name': self.name,
+            'table': self.table,
+            'columns': self.columns,
+        }
+        if self.sqlite_columns != self.columns:
+            kwargs['sqlite_columns'] = self.sqlite_columns
+        return self.__class__.__qualname__, [], kwargs
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(
+        self, app_label, schema_editor, from_state, to_state
+    ):
+        quote_name = schema_editor.quote_name
+        if is_postgresql(schema_editor):
+            sql = 'CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} ({})'
+            columns = self.columns
+        else:
+            sql = 'CREATE INDEX IF NOT EXISTS {} ON {} ({})'
+            columns = self.sqlite_columns
+        schema_editor.execute(
+            sql.format(quote_name(self.name), quote_name(self.table), columns)
+        )
+
+    def database_backwards(
+        self, app_label, schema_editor, from_state, to_state
+    ):
+        if is_postgresql(schema_editor):
+            sql = 'DROP INDEX CONCURRENTLY IF EXISTS {}'
+        else:
+            sql = 'DROP INDEX IF EXISTS {}'
+        schema_editor.execute(sql.format(schema_editor.quote_name(self.name)))
+
+    def describe(self):
+        return f'Create index {self.name} on {self.table}'
@@ -0,0 +1,284 @@
+"""
+Бэкенд PostgreSQL, который берет соединения из пула процесса.
+
+Django по-прежнему «открывает» и «закрывает» соединение на каждый запрос
+(или по CONN_MAX_AGE), но вместо установки нового соединения оно берется
+из пула, а при закрытии возвращается в него. Пул общий для всех потоков
+процесса и ограничен по размеру: если свободных соединений нет, поток
+ждет не дольше POOL['TIMEOUT'] секунд.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from functools import partial
+
+import psycopg2.extras
+
+from django.db import OperationalError
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_OPTIONS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 5,
+    'MAX_LIFETIME': 3600,
+    'CHECK_INTERVAL': 30,
+    'SLOW_WAIT': 0.1,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений psycopg2 с метриками ожидания."""
+
+    def __init__(
+        self,
+        connect,
+        max_size,
+        timeout,
+        max_lifetime,
+        check_interval,
+        slow_wait,
+    ):
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self.slow_wait = slow_wait
+        self._idle = deque()
+        self._created = {}
+        self._size = 0
+        self._condition = threading.Condition()
+        self._stats = dict.fromkeys(
+            (
+                'checkouts',
+                'waits',
+                'timeouts',
+                'opened',
+                'closed',
+                'health_check_failures',
+            ),
+            0,
+        )
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def getconn(self):
+        """Выдает проверенное соединение, при необходимости ожидая."""
+        while True:
+            connection, last_used = self._checkout()
+            if connection is None:
+                return self._open()
+            if self._is_healthy(connection, last_used):
+                return connection
+            self._discard(connection)
+
+    def putconn(self, connection):
+        """Возвращает соединение в пул или закрывает испорченное."""
+        if not self._reset(connection):
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close(self):
+        """Закрывает свободные соединения пула."""
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def stats(self):
+        """Снимок метрик пула."""
+        with self._condition:
+            return {
+                **self._stats,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+                'wait_time_total': self._wait_total,
+                'wait_time_max': self._wait_max,
+            }
+
+    def _checkout(self):
+        started = time.monotonic()
+        with self._condition:
+            self._stats['checkouts'] += 1
+            waited = False
+            while True:
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    connection = last_used = None
+                    break
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise OperationalError(
+                        f'Пул соединений исчерпан: все {self.max_size} '
+                        f'соединений заняты дольше {self.timeout} с.'
+                    )
+                waited = True
+                self._condition.wait(remaining)
+
+            wait = time.monotonic() - started
+            if waited:
+                self._stats['waits'] += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+        if wait >= self.slow_wait:
+            logger.warning('Ожидание соединения из пула: %.3f с', wait)
+        return connection, last_used
+
+    def _open(self):
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._stats['opened'] += 1
+            self._created[id(connection)] = time.monotonic()
+        return connection
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._created.pop(id(connection), None)
+            self._size -= 1
+            self._stats['closed'] += 1
+            self._condition.notify()
+
+    def _is_healthy(self, connection, last_used):
+        if connection.closed:
+            return False
+        now = time.monotonic()
+        created = self._created.get(id(connection), now)
+        if self.max_lifetime and now - created > self.max_lifetime:
+            return False
+        if now - last_used < self.check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Exception:
+            with self._condition:
+                self._stats['health_check_failures'] += 1
+            return False
+        return True
+
+    @staticmethod
+    def _reset(connection):
+        if connection.closed:
+            return False
+        status = connection.info.transaction_status
+        if status == extensions.TRANSACTION_STATUS_IDLE:
+            return True
+        if status not in (
+            extensions.TRANSACTION_STATUS_INTRANS,
+            extensions.TRANSACTION_STATUS_INERROR,
+        ):
+            return False
+        try:
+            connection.rollback()
+        except Exception:
+            return False
+        return True
+
+
+def connect(conn_params, options):
+    """
+    Устанавливает новое соединение так же, как стандартный бэкенд
+    PostgreSQL, но без привязки к конкретной обертке Django.
+    """
+    connection = base.Database.connect(**conn_params)
+    isolation_level = options.get('isolation_level')
+    if (
+        isolation_level is not None
+        and isolation_level != connection.isolation_level
+    ):
+        connection.set_session(isolation_level=isolation_level)
+    psycopg2.extras.register_default_jsonb(
+        conn_or_curs=connection, loads=lambda value: value
+    )
+    return connection
+
+
+def get_pool(alias):
+    """Пул соединений для псевдонима базы данных."""
+    return _pools.get(alias)
+
+
+def close_pools():
+    """
+    Закрывает свободные соединения всех пулов процесса. Вызывается
+    в мастер-процессе gunicorn перед запуском воркеров, чтобы они
+    не унаследовали открытые сокеты.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def pool_stats():
+    """Метрики всех пулов процесса по псевдонимам баз данных."""
+    return {alias: pool.stats() for alias, pool in _pools.items()}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Обертка PostgreSQL, получающая соединения из пула."""
+
+    def _get_pool(self, conn_params):
+        pool = _pools.get(self.alias)
+        if pool is not None:
+            return pool
+        with _pools_lock:
+            if self.alias not in _pools:
+                options = {
+                    **DEFAULT_POOL_OPTIONS,
+                    **self.settings_dict.get('POOL', {}),
+                }
+                _pools[self.alias] = ConnectionPool(
+                    connect=partial(
+                        connect, conn_params, self.settings_dict['OPTIONS']
+                    ),
+                    max_size=options['MAX_SIZE'],
+                    timeout=options['TIMEOUT'],
+                    max_lifetime=options['MAX_LIFETIME'],
+                    check_interval=options['CHECK_INTERVAL'],
+                    slow_wait=options['SLOW_WAIT'],
+                )
+            return _pools[self.alias]
+
+    def get_new_connection(self, conn_params):
+        connection = self._get_pool(conn_params).getconn()
+        self.isolation_level = connection.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = _pools.get(self.alias)
+        if pool is None:
+            # close_pools() очистил реестр, пока соединение было занято:
+            # возвращать его некуда.
+            return super()._close()
+        pool.putconn(self.connection)
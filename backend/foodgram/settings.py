@@ -1,5 +1,8 @@
 import os
+import tempfile
+from datetime import timedelta
 
+from django.core.exceptions import ImproperlyConfigured
 from django.core.management.utils import get_random_secret_key
 from dotenv import load_dotenv
 
@@ -37,6 +40,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.db_router.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,6 +78,13 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# wsgi — синхронные воркеры gunicorn, asgi — воркеры uvicorn
+# с асинхронными представлениями для загрузки и скачивания файлов.
+SERVER_INTERFACE = os.getenv('SERVER_INTERFACE', default='wsgi')
+
+# Размер пула потоков для обращений к ORM из асинхронных представлений.
+ASYNC_ORM_THREADS = int(os.getenv('ASYNC_ORM_THREADS', default='8'))
+
 
 AUTH_USER_MODEL = 'users.User'
 
@@ -87,9 +98,61 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
         'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default='0')),
     }
 }
 
+# Пул соединений для PostgreSQL: соединения переиспользуются между
+# запросами всех потоков воркера.
+if (
+    os.getenv('DB_POOL', default='False') == 'True'
+    and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql'
+):
+    DATABASES['default']['ENGINE'] = 'foodgram.pool'
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', default='10')),
+        'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default='5')),
+        'MAX_LIFETIME': int(os.getenv('DB_POOL_MAX_LIFETIME', default='3600')),
+        'CHECK_INTERVAL': int(
+            os.getenv('DB_POOL_CHECK_INTERVAL', default='30')
+        ),
+        'SLOW_WAIT': float(os.getenv('DB_POOL_SLOW_WAIT', default='0.1')),
+    }
+
+
+def replica_settings(replica):
+    """
+    Настройки реплики из DB_REPLICAS: host[:port] для PostgreSQL или путь
+    к файлу для SQLite.
+    """
+    if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+        overrides = {'NAME': replica}
+    else:
+        host, _, port = replica.partition(':')
+        overrides = {'HOST': host, 'PORT': port or DATABASES['default']['PORT']}
+    return {
+        **DATABASES['default'],
+        **overrides,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+    filter(None, os.getenv('DB_REPLICAS', default='').split(','))
+):
+    DATABASES[f'replica_{index}'] = replica_settings(replica.strip())
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+DATABASE_PRIMARY_PIN_SECONDS = int(
+    os.getenv('DB_PRIMARY_PIN_SECONDS', default='5')
+)
+# Как долго процесс доверяет последней проверке доступности реплики
+DATABASE_REPLICA_CHECK_SECONDS = int(
+    os.getenv('DB_REPLICA_CHECK_SECONDS', default='5')
+)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -105,12 +168,42 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Режим аутентификации: token — токены DRF, jwt — дополнительно
+# короткоживущие JWT access-токены (эндпоинты /api/auth/jwt/...).
+AUTH_MODE = os.getenv('AUTH_MODE', default='token')
+
+AUTH_CACHE_MAX_SIZE = int(os.getenv('AUTH_CACHE_MAX_SIZE', default='1024'))
+AUTH_CACHE_TIMEOUT = int(os.getenv('AUTH_CACHE_TIMEOUT', default='300'))
+
+AUTHENTICATION_CLASSES = ['api.authentication.CachedTokenAuthentication']
+if AUTH_MODE == 'jwt':
+    AUTHENTICATION_CLASSES.insert(
+        0, 'api.authentication.CachedJWTAuthentication'
+    )
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', default='5'))
+    ),
+    'REFRESH_TOKEN_LIFETIME': timedelta(
+        days=int(os.getenv('JWT_REFRESH_TOKEN_DAYS', default='1'))
+    ),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+}
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+    'DEFAULT_AUTHENTICATION_CLASSES': AUTHENTICATION_CLASSES,
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -148,3 +241,98 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 DEFAULT_PAGE_SIZE = 10
+
+# Время кеширования ответов анонимным пользователям (Cache-Control)
+ANONYMOUS_CACHE_MAX_AGE = int(
+    os.getenv('ANONYMOUS_CACHE_MAX_AGE', default='60')
+)
+
+FILE_CACHE_BACKEND = 'django.core.cache.backends.filebased.FileBasedCache'
+MEMCACHED_BACKEND = 'django.core.cache.backends.memcached.PyMemcacheCache'
+LOCAL_CACHE_BACKENDS = (
+    FILE_CACHE_BACKEND,
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def shared_cache_settings():
+    """
+    Общий для воркеров кеш (L2): CACHE_BACKEND и CACHE_LOCATION. По
+    умолчанию — memcached из docker-compose, а при DEBUG — файловый кеш.
+
+    Кеши одного хоста (файловый, в памяти) вне DEBUG не допускаются: их
+    incr() и add() не атомарны между воркерами, а отсев по MAX_ENTRIES
+    удаляет и ключи версий пространств имен.
+    """
+    backend = os.getenv(
+        'CACHE_BACKEND', FILE_CACHE_BACKEND if DEBUG else MEMCACHED_BACKEND
+    )
+    if not DEBUG and backend in LOCAL_CACHE_BACKENDS:
+        raise ImproperlyConfigured(
+            f'{backend} нельзя использовать как общий кеш без DEBUG: '
+            'укажите memcached или Redis в CACHE_BACKEND.'
+        )
+    if backend == FILE_CACHE_BACKEND:
+        return {
+            'BACKEND': backend,
+            'LOCATION': os.getenv(
+                'CACHE_LOCATION',
+                os.path.join(tempfile.gettempdir(), 'foodgram_cache'),
+            ),
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000'))
+            },
+        }
+    return {
+        'BACKEND': backend,
+        'LOCATION': os.getenv('CACHE_LOCATION', 'memcached:11211'),
+    }
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'foodgram.cache.TieredCache',
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_MAX_SIZE': int(os.getenv('CACHE_L1_MAX_SIZE', '1000')),
+            'L1_TIMEOUT': int(os.getenv('CACHE_L1_TIMEOUT', '5')),
+            'NAMESPACES': (
+                'recipes',
+                'tags',
+                'ingredients',
+                'users',
+                'lists',
+            ),
+        },
+    },
+    'shared': shared_cache_settings(),
+}
+
+# Аренда вычислений single_flight (api.cache.acquire_lease) должна
+# захватываться атомарно во всех воркерах: postgres (рекомендательные
+# блокировки) или cache (add() общего кеша — только memcached или Redis;
+# файловый кеш годится лишь для одного воркера).
+LEASE_BACKEND = os.getenv(
+    'LEASE_BACKEND',
+    'postgres'
+    if DATABASES['default']['ENGINE']
+    in ('foodgram.pool', 'django.db.backends.postgresql')
+    else 'cache',
+)
+
+# Шина сброса кешей процессов (api.invalidation): postgres (LISTEN/NOTIFY),
+# database (опрос таблицы событий) или local (без рассылки).
+INVALIDATION_BUS = os.getenv(
+    'INVALIDATION_BUS',
+    'postgres'
+    if DATABASES['default']['ENGINE']
+    in ('foodgram.pool', 'django.db.backends.postgresql')
+    else 'local',
+)
+INVALIDATION_CHANNEL = os.getenv('INVALIDATION_CHANNEL', 'foodgram_cache')
+# Наибольшая задержка применения события в других воркерах, сек.
+INVALIDATION_POLL_INTERVAL = float(
+    os.getenv('INVALIDATION_POLL_INTERVAL', default='1')
+)
+# Сколько хранятся события транспорта database, сек.
+INVALIDATION_EVENT_TIMEOUT = 300
@@ -0,0 +1,195 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Recipe
+from .db_router import (
+    PIN_COOKIE,
+    PRIMARY,
+    PrimaryPinningMiddleware,
+    ReplicaRouter,
+    check_replica,
+)
+
+REPLICA = 'test_replica'
+# Реплика, файл которой нельзя открыть: каталога не существует
+BROKEN = 'test_broken_replica'
+
+LOCAL_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
+
+
+@override_settings(
+    CACHES=LOCAL_CACHE,
+    DATABASE_REPLICAS=[REPLICA],
+    DATABASE_PRIMARY_PIN_SECONDS=60,
+    DATABASE_REPLICA_CHECK_SECONDS=60,
+)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Чтение с реплик, закрепление клиента и пропуск недоступных реплик."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Реплики — отдельные файлы SQLite. Псевдонимы добавляются после
+        # подготовки тестовых баз, чтобы раннер не заменил их базами в
+        # памяти и не запретил к ним запросы.
+        cls.directory = tempfile.mkdtemp()
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        connections.databases[BROKEN] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'missing', 'db.sqlite3'),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in (REPLICA, BROKEN):
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, status=200):
+        """
+        Проводит запрос через middleware. Возвращает ответ и базы для
+        чтения рецептов и токенов и для записи рецептов.
+        """
+        routes = []
+
+        def get_response(request):
+            routes.append(
+                (
+                    self.router.db_for_read(Recipe),
+                    self.router.db_for_read(Token),
+                    self.router.db_for_write(Recipe),
+                )
+            )
+            return HttpResponse(status=status)
+
+        response = PrimaryPinningMiddleware(get_response)(request)
+        return response, routes[0]
+
+    def read_db(self, request):
+        return self.route(request)[1][0]
+
+    def test_safe_request_reads_recipes_from_replica(self):
+        _, (recipes_db, tokens_db, write_db) = self.route(
+            self.factory.get('/api/recipes/')
+        )
+        self.assertEqual(recipes_db, REPLICA)
+        self.assertEqual(tokens_db, PRIMARY)
+        self.assertEqual(write_db, PRIMARY)
+
+    def test_unsafe_request_reads_from_primary(self):
+        _, (recipes_db, _, _) = self.route(self.factory.post('/api/recipes/'))
+        self.assertEqual(recipes_db, PRIMARY)
+
+    def test_anonymous_write_pins_only_its_client(self):
+        response, _ = self.route(
+            self.factory.post('/api/users/', REMOTE_ADDR='10.0.0.1'),
+            status=201,
+        )
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertTrue(cookie['httponly'])
+        self.assertEqual(cookie['max-age'], 60)
+        self.assertEqual(
+            self.read_db(
+                self.factory.get(
+                    '/api/recipes/',
+                    REMOTE_ADDR='10.0.0.1',
+                    HTTP_COOKIE=f'{PIN_COOKIE}={cookie.value}',
+                )
+            ),
+            PRIMARY,
+        )
+        # Другой клиент за тем же прокси не закреплен.
+        self.assertEqual(
+            self.read_db(
+                self.factory.get('/api/recipes/', REMOTE_ADDR='10.0.0.1')
+            ),
+            REPLICA,
+        )
+
+    def test_failed_write_does_not_pin(self):
+        response, _ = self.route(
+            self.factory.post('/api/users/', HTTP_AUTHORIZATION='Token a'),
+            status=400,
+        )
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(
+            self.read_db(
+                self.factory.get('/api/recipes/', HTTP_AUTHORIZATION='Token a')
+            ),
+            REPLICA,
+        )
+
+    def test_authenticated_write_pins_by_credentials(self):
+        response, _ = self.route(
+            self.factory.post('/api/recipes/', HTTP_AUTHORIZATION='Token a'),
+            status=201,
+        )
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(
+            self.read_db(
+                self.factory.get('/api/recipes/', HTTP_AUTHORIZATION='Token a')
+            ),
+            PRIMARY,
+        )
+        self.assertEqual(
+            self.read_db(
+                self.factory.get('/api/recipes/', HTTP_AUTHORIZATION='Token b')
+            ),
+            REPLICA,
+        )
+
+    def test_check_replica(self):
+        self.assertIs(check_replica(REPLICA), True)
+        with self.assertLogs('foodgram.db_router', 'WARNING'):
+            self.assertIs(check_replica(BROKEN), False)
+
+    @override_settings(DATABASE_REPLICAS=[BROKEN, REPLICA])
+    def test_unavailable_replica_is_skipped(self):
+        self.router = ReplicaRouter()
+        with self.assertLogs('foodgram.db_router', 'WARNING'):
+            for _ in range(3):
+                self.assertEqual(
+                    self.read_db(self.factory.get('/api/recipes/')), REPLICA
+                )
+
+    @override_settings(DATABASE_REPLICAS=[BROKEN])
+    def test_reads_fall_back_to_primary(self):
+        self.router = ReplicaRouter()
+        with self.assertLogs('foodgram.db_router', 'WARNING'):
+            self.assertEqual(
+                self.read_db(self.factory.get('/api/recipes/')), PRIMARY
+            )
+
+    def test_replica_check_is_cached(self):
+        with mock.patch(
+            'foodgram.db_router.check_replica', return_value=True
+        ) as check:
+            for _ in range(3):
+                self.read_db(self.factory.get('/api/recipes/'))
+            self.assertEqual(check.call_count, 1)
+            with override_settings(DATABASE_REPLICA_CHECK_SECONDS=0):
+                self.router = ReplicaRouter()
+                for _ in range(2):
+                    self.read_db(self.factory.get('/api/recipes/'))
+            self.assertEqual(check.call_count, 3)
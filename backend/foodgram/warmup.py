@@ -0,0 +1,130 @@
+"""
+Прогрев приложения в мастер-процессе gunicorn и в воркерах.
+
+При preload_app приложение загружается один раз в мастере, а воркеры
+получают его копию при fork. В мастере строится только то, что не
+меняется, — разобранные маршруты и модули, — и воркеры разделяют это с
+ним в режиме copy-on-write. Фрагменты первых страниц списка рецептов
+кладутся в общий кеш, поэтому первый запрос после деплоя не тратит
+время на холодный старт.
+
+Индексы в памяти (теги, ингредиенты, похожие и последние рецепты)
+меняются вместе с данными, а мастер событий шины не получает: воркер,
+перезапущенный через несколько часов, унаследовал бы их устаревшими.
+Поэтому каждый воркер строит индексы сам, после подключения слушателя
+шины.
+"""
+
+import gc
+import logging
+
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def warm_urls():
+    """Компилирует регулярные выражения и обратные словари маршрутов."""
+    resolver = get_resolver()
+    resolver.reverse_dict
+    for path in ('/api/recipes/', '/api/tags/', '/api/ingredients/'):
+        resolver.resolve(path)
+
+
+# Сколько воркер ждет подключения слушателя шины перед прогревом, сек.
+LISTENER_READY_TIMEOUT = 10
+
+
+def get_indexes():
+    from recipes.indexes import (
+        ingredient_index,
+        recent_index,
+        similarity_index,
+        tag_index,
+    )
+
+    return (tag_index, ingredient_index, similarity_index, recent_index)
+
+
+def warm_indexes():
+    """Загружает индексы тегов, ингредиентов и последних рецептов."""
+    for index in get_indexes():
+        index.build()
+
+
+def reset_indexes():
+    for index in get_indexes():
+        index.reset()
+
+
+def warm_fragments():
+    """
+    Кладет в общий кеш публичные фрагменты рецептов первых страниц
+    списка (индекс последних рецептов). Фрагменты версионированы датой
+    изменения рецепта, поэтому устаревшими они не отдаются.
+    """
+    from api.views import RecipeViewSet
+    from recipes.indexes import recent_index
+    from recipes.models import Recipe
+    from recipes.versions import CATALOGS, get_catalog_versions
+
+    # Индекс последних рецептов нужен только для списка id: перед fork
+    # его сбрасывает warmup().
+    recipe_ids, _ = recent_index.first()
+    rows = list(
+        Recipe.objects.filter(id__in=recipe_ids)
+        .order_by()
+        .values_list('id', 'updated_at')
+    )
+    versions = get_catalog_versions(*CATALOGS)
+    RecipeViewSet().store_fragments(Recipe.objects.all(), rows, versions)
+
+
+def warmup():
+    """Прогревает приложение и готовит мастер-процесс к fork."""
+    from PIL import Image
+
+    Image.init()
+    warm_urls()
+    try:
+        warm_fragments()
+    except Exception:
+        # База может быть еще недоступна при старте контейнера.
+        logger.warning('Фрагменты не загружены в кеш', exc_info=True)
+    reset_indexes()
+
+    connections.close_all()
+    # Соединения с общим кешем не должны переходить в воркеры.
+    for cache in caches.all():
+        cache.close()
+    if any(
+        connection.settings_dict['ENGINE'] == 'foodgram.pool'
+        for connection in connections.all()
+    ):
+        from foodgram.pool.base import close_pools
+
+        close_pools()
+    gc.collect()
+    gc.freeze()
+
+
+def warm_worker(listener=None):
+    """
+    Строит индексы в воркере после fork. Если шина сброса кешей
+    включена, сначала дожидается подключения слушателя: изменения после
+    этого момента он доставит, а сделанные раньше попадут в индексы.
+    """
+    if listener is not None and not listener.ready.wait(
+        LISTENER_READY_TIMEOUT
+    ):
+        logger.warning('Слушатель шины не подключился, индексы не прогреты')
+        return
+    try:
+        warm_indexes()
+    except DatabaseError:
+        # Индексы построятся при первом обращении.
+        logger.warning('Индексы не загружены при прогреве', exc_info=True)
+    finally:
+        connections.close_all()
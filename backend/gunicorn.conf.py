@@ -0,0 +1,43 @@
+"""Настройки gunicorn."""
+
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0:8080')
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
+
+if os.getenv('SERVER_INTERFACE', 'wsgi') == 'asgi':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+
+# Приложение загружается и прогревается в мастере до запуска воркеров.
+preload_app = True
+
+
+def when_ready(server):
+    from foodgram.warmup import warmup
+
+    warmup()
+
+
+def post_worker_init(worker):
+    from api.invalidation import start_listener
+    from foodgram.warmup import warm_worker
+
+    warm_worker(start_listener())
+
+
+def worker_exit(server, worker):
+    from django.core.cache import cache
+
+    from foodgram.pool.base import pool_stats
+
+    # Метрики процесса: пулы соединений с базой и попадания в кеш.
+    server.log.info(
+        'Worker stats (pid: %s): db pools %s, cache %s',
+        worker.pid,
+        pool_stats(),
+        cache.stats(),
+    )
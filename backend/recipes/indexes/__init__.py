@@ -0,0 +1,16 @@
+"""Индексы рецептов, которые хранятся в памяти процесса."""
+
+from .pantry import ingredient_index
+from .recent import RECENT_INDEX_SIZE, recent_index
+from .similarity import similarity_index
+from .tags import TAGS_MODE_ALL, TAGS_MODE_ANY, tag_index
+
+__all__ = (
+    'RECENT_INDEX_SIZE',
+    'TAGS_MODE_ALL',
+    'TAGS_MODE_ANY',
+    'ingredient_index',
+    'recent_index',
+    'similarity_index',
+    'tag_index',
+)
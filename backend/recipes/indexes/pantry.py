@@ -0,0 +1,139 @@
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import chain
+
+
+class IngredientIndex:
+    """
+    Инвертированный индекс «ингредиент -> отсортированные id рецептов».
+
+    Строится лениво при первом обращении одним запросом к RecipeIngredient
+    и дальше поддерживается сигналами без обращений к базе.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = None
+        self._recipes = {}
+
+    @property
+    def is_built(self):
+        return self._postings is not None
+
+    def build(self):
+        """Полностью перестраивает индекс по таблице RecipeIngredient."""
+        from recipes.models import RecipeIngredient
+
+        postings = defaultdict(list)
+        recipes = defaultdict(set)
+        rows = (
+            RecipeIngredient.objects.order_by('ingredient_id', 'recipe_id')
+            .values_list('ingredient_id', 'recipe_id')
+            .iterator()
+        )
+        for ingredient_id, recipe_id in rows:
+            postings[ingredient_id].append(recipe_id)
+            recipes[recipe_id].add(ingredient_id)
+
+        with self._lock:
+            self._postings = {
+                ingredient_id: array('q', recipe_ids)
+                for ingredient_id, recipe_ids in postings.items()
+            }
+            self._recipes = dict(recipes)
+
+    def reset(self):
+        """Сбрасывает индекс, он будет построен заново при обращении."""
+        with self._lock:
+            self._postings = None
+            self._recipes = {}
+
+    def _ensure_built(self):
+        if self._postings is None:
+            with self._lock:
+                if self._postings is None:
+                    self.build()
+
+    def add(self, recipe_id, ingredient_id):
+        """Добавляет ингредиент рецепта в построенный индекс."""
+        with self._lock:
+            if self._postings is None:
+                return
+            ingredients = self._recipes.setdefault(recipe_id, set())
+            if ingredient_id in ingredients:
+                return
+            ingredients.add(ingredient_id)
+            posting = self._postings.setdefault(ingredient_id, array('q'))
+            posting.insert(bisect_left(posting, recipe_id), recipe_id)
+
+    def discard(self, recipe_id, ingredient_id):
+        """Удаляет ингредиент рецепта из построенного индекса."""
+        with self._lock:
+            if self._postings is None:
+                return
+            ingredients = self._recipes.get(recipe_id)
+            if not ingredients or ingredient_id not in ingredients:
+                return
+            ingredients.discard(ingredient_id)
+            if not ingredients:
+                del self._recipes[recipe_id]
+            posting = self._postings[ingredient_id]
+            del posting[bisect_left(posting, recipe_id)]
+            if not posting:
+                del self._postings[ingredient_id]
+
+    def refresh_recipe(self, recipe_id):
+        """Перечитывает из базы ингредиенты одного рецепта."""
+        from recipes.models import RecipeIngredient
+
+        if self._postings is None:
+            return
+        actual = set(
+            RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+                'ingredient_id', flat=True
+            )
+        )
+        with self._lock:
+            current = set(self._recipes.get(recipe_id, ()))
+            for ingredient_id in current - actual:
+                self.discard(recipe_id, ingredient_id)
+            for ingredient_id in actual - current:
+                self.add(recipe_id, ingredient_id)
+
+    def ingredients_of(self, recipe_id):
+        """Возвращает множество id ингредиентов рецепта."""
+        self._ensure_built()
+        return frozenset(self._recipes.get(recipe_id, ()))
+
+    def match(self, pantry, max_missing):
+        """
+        Ранжирует рецепты по покрытию ингредиентами из кладовой.
+
+        Возвращает список пар (id рецепта, число недостающих ингредиентов):
+        сначала рецепты, которые можно приготовить целиком, затем те, где
+        не хватает одного, двух и т.д. ингредиентов (не более max_missing).
+        Учитываются только рецепты хотя бы с одним совпадением.
+        """
+        self._ensure_built()
+        with self._lock:
+            postings = [
+                self._postings[ingredient_id]
+                for ingredient_id in set(pantry)
+                if ingredient_id in self._postings
+            ]
+            hits = Counter(chain.from_iterable(postings))
+            sizes = {
+                recipe_id: len(self._recipes[recipe_id]) for recipe_id in hits
+            }
+        ranked = [
+            (sizes[recipe_id] - count, -recipe_id)
+            for recipe_id, count in hits.items()
+            if sizes[recipe_id] - count <= max_missing
+        ]
+        ranked.sort()
+        return [(-recipe_id, missing) for missing, recipe_id in ranked]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,130 @@
+import threading
+from bisect import bisect_left, insort
+
+from .tags import tag_index
+
+# Глубина первых страниц: три страницы по 50 рецептов.
+RECENT_INDEX_SIZE = 150
+
+
+class RecentIndex:
+    """
+    Id рецептов в порядке убывания даты публикации (-pub_date, -id).
+
+    Отвечает на первые страницы списка рецептов без фильтров или с одним
+    тегом. Даты публикации хранятся для всех рецептов, принадлежность
+    тегам берется из битовых карт tag_index. Первые RECENT_INDEX_SIZE id
+    (всех рецептов и каждого тега) вычисляются при обращении и хранятся
+    до изменения рецептов или их тегов.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = None
+        self._dates = {}
+        self._tops = {}
+
+    @property
+    def is_built(self):
+        return self._keys is not None
+
+    def build(self):
+        """Загружает даты публикации всех рецептов."""
+        from recipes.models import Recipe
+
+        rows = Recipe.objects.order_by().values_list('id', 'pub_date')
+        dates = dict(rows.iterator())
+        keys = sorted(
+            (pub_date, recipe_id) for recipe_id, pub_date in dates.items()
+        )
+
+        with self._lock:
+            self._dates = dates
+            self._keys = keys
+            self._tops = {}
+
+    def reset(self):
+        """Сбрасывает индекс, он будет построен заново при обращении."""
+        with self._lock:
+            self._keys = None
+            self._dates = {}
+            self._tops = {}
+
+    def _ensure_built(self):
+        if self._keys is None:
+            with self._lock:
+                if self._keys is None:
+                    self.build()
+
+    def add(self, recipe_id, pub_date):
+        """Добавляет опубликованный рецепт."""
+        with self._lock:
+            if self._keys is None or recipe_id in self._dates:
+                return
+            self._dates[recipe_id] = pub_date
+            insort(self._keys, (pub_date, recipe_id))
+            self._tops = {}
+
+    def discard_recipe(self, recipe_id):
+        """Удаляет рецепт из индекса."""
+        with self._lock:
+            if self._keys is None:
+                return
+            pub_date = self._dates.pop(recipe_id, None)
+            if pub_date is None:
+                return
+            del self._keys[bisect_left(self._keys, (pub_date, recipe_id))]
+            self._tops = {}
+
+    def refresh_recipe(self, recipe_id):
+        """Перечитывает из базы дату публикации рецепта."""
+        from recipes.models import Recipe
+
+        if self._keys is None:
+            return
+        pub_date = (
+            Recipe.objects.filter(id=recipe_id)
+            .values_list('pub_date', flat=True)
+            .first()
+        )
+        with self._lock:
+            self.discard_recipe(recipe_id)
+            if pub_date is not None:
+                self.add(recipe_id, pub_date)
+            self._tops = {}
+
+    def clear_tags(self):
+        """Сбрасывает первые id тегов после изменения тегов рецептов."""
+        with self._lock:
+            self._tops = {}
+
+    def first(self, slug=None):
+        """
+        Первые id рецептов (не больше RECENT_INDEX_SIZE) и их общее число:
+        всех рецептов или рецептов с тегом slug.
+        """
+        self._ensure_built()
+        with self._lock:
+            top = self._tops.get(slug)
+            if top is None:
+                top = self._tops[slug] = self._top(slug)
+            return top
+
+    def _top(self, slug):
+        if slug is None:
+            ids = [
+                recipe_id
+                for _, recipe_id in reversed(self._keys[-RECENT_INDEX_SIZE:])
+            ]
+            return ids, len(self._keys)
+        bitmap = tag_index.bitmap([slug])
+        ids = []
+        for _, recipe_id in reversed(self._keys):
+            if len(ids) == RECENT_INDEX_SIZE:
+                break
+            if bitmap >> recipe_id & 1:
+                ids.append(recipe_id)
+        return ids, bin(bitmap).count('1')
+
+
+recent_index = RecentIndex()
@@ -0,0 +1,178 @@
+import random
+import threading
+from collections import defaultdict
+
+from .pantry import ingredient_index
+
+NUM_PERMUTATIONS = 64
+BANDS = 32
+ROWS = NUM_PERMUTATIONS // BANDS
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+_random = random.Random(20241214)
+PERMUTATIONS = [
+    (
+        _random.randint(1, MERSENNE_PRIME - 1),
+        _random.randint(0, MERSENNE_PRIME - 1),
+    )
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def minhash(ingredient_ids):
+    """Вычисляет MinHash-сигнатуру множества ингредиентов."""
+    if not ingredient_ids:
+        return [MAX_HASH] * NUM_PERMUTATIONS
+    return [
+        min(
+            (a * ingredient_id + b) % MERSENNE_PRIME & MAX_HASH
+            for ingredient_id in ingredient_ids
+        )
+        for a, b in PERMUTATIONS
+    ]
+
+
+def jaccard(first, second):
+    """Точный коэффициент Жаккара двух множеств."""
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class SimilarityIndex:
+    """
+    LSH-индекс MinHash-сигнатур рецептов по множествам ингредиентов.
+
+    Сигнатуры хранятся в поле Recipe.ingredients_minhash, а корзины LSH
+    собираются в памяти процесса при первом обращении.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._signatures = None
+        self._buckets = defaultdict(set)
+
+    def reset(self):
+        with self._lock:
+            self._signatures = None
+            self._buckets = defaultdict(set)
+
+    def build(self):
+        """
+        Собирает корзины LSH. Недостающие сигнатуры считаются в памяти:
+        build() вызывается при чтении и при прогреве в мастере gunicorn и
+        не пишет в базу.
+        """
+        from recipes.models import Recipe
+
+        signatures = {}
+        rows = Recipe.objects.order_by().values_list(
+            'id', 'ingredients_minhash'
+        )
+        for recipe_id, signature in rows.iterator():
+            if signature is None:
+                signature = minhash(ingredient_index.ingredients_of(recipe_id))
+            signatures[recipe_id] = signature
+
+        with self._lock:
+            self._signatures = {}
+            self._buckets = defaultdict(set)
+            for recipe_id, signature in signatures.items():
+                self._insert(recipe_id, signature)
+
+    def _ensure_built(self):
+        if self._signatures is None:
+            with self._lock:
+                if self._signatures is None:
+                    self.build()
+
+    @staticmethod
+    def _bands(signature):
+        for band in range(BANDS):
+            yield band, tuple(signature[band * ROWS:(band + 1) * ROWS])
+
+    @staticmethod
+    def _store(recipe_id):
+        from recipes.models import Recipe
+
+        signature = minhash(ingredient_index.ingredients_of(recipe_id))
+        Recipe.objects.filter(id=recipe_id).update(
+            ingredients_minhash=signature
+        )
+        return signature
+
+    def _insert(self, recipe_id, signature):
+        self._signatures[recipe_id] = signature
+        for key in self._bands(signature):
+            self._buckets[key].add(recipe_id)
+
+    def _remove(self, recipe_id):
+        signature = self._signatures.pop(recipe_id, None)
+        if signature is None:
+            return
+        for key in self._bands(signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(recipe_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def refresh_recipe(self, recipe_id, store=True):
+        """
+        Пересчитывает и сохраняет сигнатуру рецепта. При store=False
+        сигнатура только обновляется в корзинах: в базу ее уже сохранил
+        процесс, изменивший рецепт.
+        """
+        from recipes.models import Recipe
+
+        if not store and self._signatures is None:
+            return
+        if not Recipe.objects.filter(id=recipe_id).exists():
+            self.discard_recipe(recipe_id)
+            return
+        if store:
+            signature = self._store(recipe_id)
+        else:
+            signature = minhash(ingredient_index.ingredients_of(recipe_id))
+        with self._lock:
+            if self._signatures is None:
+                return
+            self._remove(recipe_id)
+            self._insert(recipe_id, signature)
+
+    def discard_recipe(self, recipe_id):
+        """Удаляет рецепт из корзин LSH."""
+        with self._lock:
+            if self._signatures is not None:
+                self._remove(recipe_id)
+
+    def similar(self, recipe_id, min_similarity):
+        """
+        Возвращает пары (id рецепта, коэффициент Жаккара), отсортированные
+        по убыванию сходства. Кандидаты берутся из общих корзин LSH,
+        коэффициент считается точно по индексу ингредиентов.
+        """
+        self._ensure_built()
+        with self._lock:
+            signature = self._signatures.get(recipe_id)
+            if signature is None:
+                return []
+            candidates = set()
+            for key in self._bands(signature):
+                candidates |= self._buckets.get(key, set())
+        candidates.discard(recipe_id)
+
+        ingredients = ingredient_index.ingredients_of(recipe_id)
+        scored = []
+        for candidate in candidates:
+            similarity = jaccard(
+                ingredients, ingredient_index.ingredients_of(candidate)
+            )
+            if similarity >= min_similarity:
+                scored.append((candidate, similarity))
+        scored.sort(key=lambda item: (-item[1], -item[0]))
+        return scored
+
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,142 @@
+import threading
+
+TAGS_MODE_ANY = 'any'
+TAGS_MODE_ALL = 'all'
+
+
+def bitmap_to_ids(bitmap):
+    """Возвращает id рецептов из битовой карты в порядке убывания."""
+    bits = bin(bitmap)[2:]
+    top = len(bits) - 1
+    ids = []
+    position = bits.find('1')
+    while position != -1:
+        ids.append(top - position)
+        position = bits.find('1', position + 1)
+    return ids
+
+
+class TagIndex:
+    """
+    Битовые карты рецептов по тегам: бит с номером id рецепта установлен,
+    если у рецепта есть тег. Фильтрация по нескольким тегам сводится
+    к побитовым операциям без соединения с таблицей тегов.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._bitmaps = None
+        self._slugs = {}
+
+    @property
+    def is_built(self):
+        return self._bitmaps is not None
+
+    def build(self):
+        """Строит карты по таблице связей рецептов и тегов."""
+        from recipes.models import Recipe, Tag
+
+        slugs = dict(Tag.objects.values_list('id', 'slug'))
+        # Теги без slug нельзя выбрать в фильтре, карты для них не нужны.
+        bitmaps = {slug: 0 for slug in slugs.values() if slug is not None}
+        rows = Recipe.tags.through.objects.values_list('tag_id', 'recipe_id')
+        for tag_id, recipe_id in rows.iterator():
+            slug = slugs[tag_id]
+            if slug is not None:
+                bitmaps[slug] |= 1 << recipe_id
+
+        with self._lock:
+            self._slugs = slugs
+            self._bitmaps = bitmaps
+
+    def reset(self):
+        """Сбрасывает карты, они будут построены заново при обращении."""
+        with self._lock:
+            self._bitmaps = None
+            self._slugs = {}
+
+    def _ensure_built(self):
+        if self._bitmaps is None:
+            with self._lock:
+                if self._bitmaps is None:
+                    self.build()
+
+    def add(self, recipe_id, tag_ids):
+        """Отмечает рецепт в картах указанных тегов."""
+        with self._lock:
+            if self._bitmaps is None:
+                return
+            for tag_id in tag_ids:
+                if tag_id not in self._slugs:
+                    self._bitmaps = None
+                    return
+                slug = self._slugs[tag_id]
+                if slug is not None:
+                    self._bitmaps[slug] |= 1 << recipe_id
+
+    def remove(self, recipe_id, tag_ids):
+        """Снимает отметку рецепта в картах указанных тегов."""
+        with self._lock:
+            if self._bitmaps is None:
+                return
+            for tag_id in tag_ids:
+                slug = self._slugs.get(tag_id)
+                if slug in self._bitmaps:
+                    self._bitmaps[slug] &= ~(1 << recipe_id)
+
+    def refresh_recipe(self, recipe_id):
+        """Перечитывает из базы теги одного рецепта."""
+        from recipes.models import Recipe
+
+        if self._bitmaps is None:
+            return
+        tag_ids = list(
+            Recipe.tags.through.objects.filter(recipe_id=recipe_id)
+            .values_list('tag_id', flat=True)
+        )
+        with self._lock:
+            self.discard_recipe(recipe_id)
+            self.add(recipe_id, tag_ids)
+
+    def discard_recipe(self, recipe_id):
+        """Снимает отметку рецепта во всех картах."""
+        with self._lock:
+            if self._bitmaps is None:
+                return
+            mask = ~(1 << recipe_id)
+            for slug in self._bitmaps:
+                self._bitmaps[slug] &= mask
+
+    def bitmap(self, slugs, mode=TAGS_MODE_ANY):
+        """Объединение (any) или пересечение (all) карт тегов."""
+        self._ensure_built()
+        with self._lock:
+            bitmaps = [self._bitmaps.get(slug, 0) for slug in set(slugs)]
+        if not bitmaps:
+            return 0
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            if mode == TAGS_MODE_ALL:
+                result &= bitmap
+            else:
+                result |= bitmap
+        return result
+
+    def recipe_ids(self, slugs, mode=TAGS_MODE_ANY):
+        """Id рецептов с указанными тегами в порядке убывания."""
+        return bitmap_to_ids(self.bitmap(slugs, mode))
+
+    def few_recipe_ids(self, slugs, mode=TAGS_MODE_ANY, limit=500):
+        """
+        Id рецептов с тегами, если индекс уже построен и их не больше
+        limit, иначе None. Индекс здесь не строится.
+        """
+        if self._bitmaps is None:
+            return None
+        bitmap = self.bitmap(slugs, mode)
+        if bin(bitmap).count('1') > limit:
+            return None
+        return bitmap_to_ids(bitmap)
+
+
+tag_index = TagIndex()
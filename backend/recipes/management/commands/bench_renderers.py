@@ -0,0 +1,103 @@
+import io
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer
+from api.views import IngredientViewSet, RecipeViewSet
+
+
+def default_host():
+    for host in settings.ALLOWED_HOSTS:
+        host = host.lstrip('.')
+        if host and host != '*':
+            return host
+    return 'localhost'
+
+
+def best_time(func, number, repeat=5):
+    """Лучшее время одного вызова из repeat серий по number вызовов, мс."""
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return best / number * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Micro-benchmark the orjson renderer and parser against DRF '
+        'JSONRenderer and JSONParser on payloads of the ingredient list '
+        'and recipe list endpoints'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            nargs='+',
+            default=[6, 50],
+            help='Recipe list page sizes',
+        )
+        parser.add_argument(
+            '--number', type=int, default=50, help='Calls per series'
+        )
+        parser.add_argument(
+            '--host',
+            default=default_host(),
+            help='Host for absolute links in the payloads',
+        )
+
+    def handle(self, *args, **options):
+        factory = RequestFactory(HTTP_HOST=options['host'])
+        payloads = [
+            (
+                'ingredients',
+                IngredientViewSet.as_view({'get': 'list'}),
+                factory.get('/api/ingredients/'),
+            )
+        ]
+        for limit in options['limit']:
+            payloads.append(
+                (
+                    f'recipes?limit={limit}',
+                    RecipeViewSet.as_view({'get': 'list'}),
+                    factory.get('/api/recipes/', {'limit': limit}),
+                )
+            )
+
+        self.stdout.write(
+            f'{"payload":<18} {"KB":>8} {"render json":>12} '
+            f'{"orjson":>8} {"x":>6} {"parse json":>11} {"orjson":>8} '
+            f'{"x":>6}  identical'
+        )
+        for name, view, request in payloads:
+            response = view(request)
+            if response.status_code != 200:
+                raise CommandError(f'{name}: HTTP {response.status_code}')
+            self.bench(name, response.data, options['number'])
+
+    def bench(self, name, data, number):
+        json_renderer = JSONRenderer()
+        orjson_renderer = ORJSONRenderer()
+        body = json_renderer.render(data)
+        identical = orjson_renderer.render(data) == body
+        render_json = best_time(lambda: json_renderer.render(data), number)
+        render_orjson = best_time(lambda: orjson_renderer.render(data), number)
+
+        json_parser = JSONParser()
+        orjson_parser = ORJSONParser()
+        parse_json = best_time(
+            lambda: json_parser.parse(io.BytesIO(body)), number
+        )
+        parse_orjson = best_time(
+            lambda: orjson_parser.parse(io.BytesIO(body)), number
+        )
+        self.stdout.write(
+            f'{name:<18} {len(body) / 1024:>8.1f} {render_json:>9.3f} ms '
+            f'{render_orjson:>8.3f} {render_json / render_orjson:>6.1f} '
+            f'{parse_json:>8.3f} ms {parse_orjson:>8.3f} '
+            f'{parse_json / parse_orjson:>6.1f}  {identical}'
+        )
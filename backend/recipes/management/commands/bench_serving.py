@@ -0,0 +1,208 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import Recipe
+
+INTERFACES = ('wsgi', 'asgi')
+# Сколько ждать, пока gunicorn загрузит и прогреет приложение, сек.
+STARTUP_TIMEOUT = 60
+# Строка лога, которую воркер пишет при выходе (gunicorn.conf.py)
+WORKER_STATS = 'Worker stats'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(process, port):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(
+                f'gunicorn exited with code {process.returncode}'
+            )
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f'gunicorn did not start in {STARTUP_TIMEOUT}s')
+
+
+def run_load(host, port, paths, headers, concurrency, total):
+    """
+    Отправляет total запросов из concurrency потоков, у каждого свое
+    keep-alive соединение. Возвращает время, задержки и число ошибок.
+    """
+    latencies = []
+    errors = []
+    counter = iter(range(total))
+    lock = threading.Lock()
+
+    def worker():
+        connection = http.client.HTTPConnection(host, port, timeout=30)
+        try:
+            while True:
+                with lock:
+                    number = next(counter, None)
+                if number is None:
+                    return
+                path = paths[number % len(paths)]
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', path, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    failed = response.status >= 400
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    failed = True
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+                    if failed:
+                        errors.append(path)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, len(errors)
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput and latency per worker of the WSGI (sync '
+        'gunicorn) and ASGI (uvicorn) serving modes on I/O-bound endpoints'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interface',
+            action='append',
+            choices=INTERFACES,
+            help='Serving mode to start (default: both)',
+        )
+        parser.add_argument(
+            '--url',
+            help='Benchmark an already running server instead of starting '
+            'gunicorn',
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            help='Request path (default: short link of the first recipe; '
+            'with --token also the shopping list download)',
+        )
+        parser.add_argument('--token', help='Auth token for the requests')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[1, 8, 32],
+            help='Concurrent clients',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Requests per concurrency level',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1, help='gunicorn workers'
+        )
+
+    def handle(self, *args, **options):
+        paths = options['path'] or self.default_paths(options['token'])
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+
+        if options['url']:
+            url = urlsplit(options['url'])
+            self.report(
+                'server', url.hostname, url.port or 80, paths, headers,
+                options,
+            )
+            return
+        for interface in options['interface'] or INTERFACES:
+            port = free_port()
+            with tempfile.TemporaryFile(mode='w+') as log:
+                process = self.start(interface, port, options['workers'], log)
+                try:
+                    wait_for_port(process, port)
+                    self.report(
+                        interface, '127.0.0.1', port, paths, headers, options
+                    )
+                finally:
+                    process.terminate()
+                    try:
+                        process.wait(10)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+                log.seek(0)
+                for line in log:
+                    if WORKER_STATS in line:
+                        self.stdout.write(line.rstrip())
+
+    def default_paths(self, token):
+        recipe_id = Recipe.objects.values_list('id', flat=True).first()
+        if recipe_id is None:
+            raise CommandError('No recipes to request, pass --path')
+        paths = [f'/api/recipes/{recipe_id}/get-link/']
+        if token:
+            paths.append('/api/recipes/download_shopping_cart/')
+        return paths
+
+    def start(self, interface, port, workers, log):
+        env = {
+            **os.environ,
+            'SERVER_INTERFACE': interface,
+            'GUNICORN_BIND': f'127.0.0.1:{port}',
+            'GUNICORN_WORKERS': str(workers),
+            'GUNICORN_THREADS': '1',
+        }
+        return subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py'],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=log,
+        )
+
+    def report(self, label, host, port, paths, headers, options):
+        # Первые запросы прогревают соединения с базой и кеши.
+        run_load(host, port, paths, headers, 1, len(paths) * 5)
+        self.stdout.write(
+            f'{label}: {options["workers"]} worker(s), {", ".join(paths)}'
+        )
+        self.stdout.write(
+            f'{"clients":>8} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"errors":>7}'
+        )
+        for concurrency in options['concurrency']:
+            elapsed, latencies, errors = run_load(
+                host, port, paths, headers, concurrency, options['requests']
+            )
+            quantiles = statistics.quantiles(latencies, n=20)
+            self.stdout.write(
+                f'{concurrency:>8} {len(latencies) / elapsed:>9.1f} '
+                f'{quantiles[9] * 1000:>8.1f} {quantiles[18] * 1000:>8.1f} '
+                f'{errors:>7}'
+            )
@@ -0,0 +1,162 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from api.documents import build_documents, get_documents
+from api.fragments import personalize
+from api.projections import RecipeProjection
+from api.serializers import RecipeReadSerializer
+from api.views import VALIDATOR_COLUMNS, RecipeViewSet
+from recipes.models import FavoriteRecipe, Recipe
+
+from .bench_renderers import default_host
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that every fast read path renders recipes byte for byte '
+        'like RecipeReadSerializer: the projection, the single-query '
+        'PostgreSQL document and the stored recipe documents'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Number of the latest recipes to check',
+        )
+        parser.add_argument(
+            '--user',
+            help='Username to check personal flags for (default: the '
+            'first user with favorites)',
+        )
+        parser.add_argument(
+            '--host',
+            default=default_host(),
+            help='Host for absolute links',
+        )
+
+    def handle(self, *args, **options):
+        recipe_ids = list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)[
+                : options['limit']
+            ]
+        )
+        if not recipe_ids:
+            raise CommandError('No recipes to check')
+        self.renderer = JSONRenderer()
+        self.mismatches = 0
+        factory = RequestFactory(HTTP_HOST=options['host'])
+        for user in (AnonymousUser(), self.get_user(options['user'])):
+            if user is None:
+                continue
+            view = RecipeViewSet(
+                action_map={'get': 'list'}, format_kwarg=None, kwargs={}
+            )
+            view.request = view.initialize_request(
+                factory.get('/api/recipes/')
+            )
+            view.request.user = user
+            self.check_user(view, recipe_ids)
+
+        stored = self.count_stored(recipe_ids)
+        if stored < len(recipe_ids):
+            self.stdout.write(
+                f'{len(recipe_ids) - stored} recipes have no stored '
+                'document; run rebuild_documents --missing'
+            )
+        if self.mismatches:
+            raise CommandError(f'{self.mismatches} mismatches')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'All read paths match the serializer for '
+                f'{len(recipe_ids)} recipes'
+            )
+        )
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User {username} does not exist')
+        user_id = FavoriteRecipe.objects.values_list('user_id', flat=True)
+        return User.objects.filter(id__in=user_id[:1]).first() or (
+            User.objects.order_by('id').first()
+        )
+
+    def count_stored(self, recipe_ids):
+        return Recipe.objects.filter(
+            id__in=recipe_ids, document__isnull=False
+        ).count()
+
+    def check_user(self, view, recipe_ids):
+        request = view.request
+        queryset = view.get_queryset().filter(id__in=recipe_ids)
+        label = request.user.username or 'anonymous'
+        expected = {
+            data['id']: self.render(data)
+            for data in RecipeReadSerializer(
+                queryset, many=True, context={'request': request}
+            ).data
+        }
+        flags = {
+            row[0]: row[2:] for row in queryset.values_list(*VALIDATOR_COLUMNS)
+        }
+
+        projection = RecipeProjection(request)
+        paths = {
+            'projection': {
+                data['id']: data
+                for data in projection.serialize(projection.values(queryset))
+            },
+            'projection retrieve': {
+                recipe_id: projection.retrieve(queryset, recipe_id)
+                for recipe_id in recipe_ids
+            },
+            'public projection': self.personalize(
+                request, build_documents(recipe_ids), flags
+            ),
+            'stored documents': self.personalize(
+                request, get_documents(recipe_ids, using=queryset.db), flags
+            ),
+        }
+        if connections[queryset.db].vendor == 'postgresql':
+            paths['document SQL'] = {
+                recipe_id: projection.document(queryset.db, recipe_id)
+                for recipe_id in recipe_ids
+            }
+        else:
+            self.stdout.write(
+                f'{label}: document SQL skipped, it needs PostgreSQL'
+            )
+
+        for path, rendered in paths.items():
+            checked = 0
+            for recipe_id, data in rendered.items():
+                checked += 1
+                actual = self.render(data)
+                if actual != expected[recipe_id]:
+                    self.mismatches += 1
+                    self.stderr.write(
+                        f'{label}: {path} differs for recipe {recipe_id}\n'
+                        f'  serializer: {expected[recipe_id].decode()}\n'
+                        f'  {path}: {actual.decode()}'
+                    )
+            self.stdout.write(f'{label}: {path}: {checked} recipes checked')
+
+    @staticmethod
+    def personalize(request, fragments, flags):
+        return {
+            recipe_id: personalize(request, fragment, *flags[recipe_id])
+            for recipe_id, fragment in fragments.items()
+        }
+
+    def render(self, data):
+        return self.renderer.render(data)
@@ -0,0 +1,180 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import RequestFactory
+from rest_framework.exceptions import ValidationError
+
+from api.views import (
+    VALIDATOR_COLUMNS,
+    CustomUserViewSet,
+    IngredientViewSet,
+    RecipeViewSet,
+)
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+PAGE_SIZE = 10
+
+# Полный просмотр таблицы в плане: PostgreSQL и SQLite
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'SCAN (?:TABLE )?(\w+)(?!.*USING)'),
+}
+
+
+def make_view(viewset, action, path, params, user):
+    """Представление с GET-запросом пользователя user, как в эндпоинте."""
+    view = viewset(
+        action_map={'get': action}, format_kwarg=None, args=(), kwargs={}
+    )
+    view.request = view.initialize_request(RequestFactory().get(path, params))
+    view.request.user = user
+    return view
+
+
+def recipe_list(user, params):
+    """
+    Главный запрос списка рецептов: узкие строки страницы после фильтров
+    RecipeFilter (см. RecipeViewSet.list_page).
+    """
+    view = make_view(RecipeViewSet, 'list', '/api/recipes/', params, user)
+    queryset = view.filter_queryset(view.get_queryset())
+    return queryset.values_list(*VALIDATOR_COLUMNS)[:PAGE_SIZE]
+
+
+def ingredient_list(user, params):
+    view = make_view(
+        IngredientViewSet, 'list', '/api/ingredients/', params, user
+    )
+    return view.filter_queryset(view.get_queryset())
+
+
+def subscriptions(user):
+    view = make_view(
+        CustomUserViewSet,
+        'subscriptions',
+        '/api/users/subscriptions/',
+        {},
+        user,
+    )
+    return view.get_subscriptions()[:PAGE_SIZE]
+
+
+def main_queries(user, author_id, tag_slug, ingredient_ids, prefix):
+    """
+    Пары (название, queryset) главных запросов эндпоинтов, построенные
+    кодом представлений и фильтров для пользователя user.
+    """
+    return [
+        ('GET /api/recipes/', recipe_list(user, {})),
+        (
+            'GET /api/recipes/?author=',
+            recipe_list(user, {'author': author_id}),
+        ),
+        ('GET /api/recipes/?tags=', recipe_list(user, {'tags': tag_slug})),
+        (
+            'GET /api/recipes/?ingredients=',
+            recipe_list(user, {'ingredients': ingredient_ids}),
+        ),
+        (
+            'GET /api/recipes/?exclude_ingredients=',
+            recipe_list(user, {'exclude_ingredients': ingredient_ids}),
+        ),
+        (
+            'GET /api/recipes/?is_favorited=1',
+            recipe_list(user, {'is_favorited': 1}),
+        ),
+        (
+            'GET /api/recipes/?is_in_shopping_cart=1',
+            recipe_list(user, {'is_in_shopping_cart': 1}),
+        ),
+        (
+            'GET /api/ingredients/?name=',
+            ingredient_list(user, {'name': prefix}),
+        ),
+        ('GET /api/users/subscriptions/', subscriptions(user)),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Capture EXPLAIN for the main query of each endpoint and fail if '
+        'it falls back to a sequential scan'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS, help='Database alias'
+        )
+        parser.add_argument(
+            '--show', action='store_true', help='Print query plans'
+        )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        connection = connections[using]
+        pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(
+                f'EXPLAIN is not supported for {connection.vendor}'
+            )
+
+        user = User.objects.using(using).order_by('id').first()
+        if user is None:
+            raise CommandError('No users to build the queries for')
+        author_id = Recipe.objects.using(using).values_list(
+            'author_id', flat=True
+        )
+        slug = Tag.objects.using(using).values_list('slug', flat=True)
+        # Два ингредиента из рецептов: фильтр строит EXISTS на каждый.
+        ingredient_ids = list(
+            RecipeIngredient.objects.using(using)
+            .order_by('ingredient_id')
+            .values_list('ingredient_id', flat=True)
+            .distinct()[:2]
+        )
+        if not ingredient_ids:
+            ingredient_ids = list(
+                Ingredient.objects.using(using).values_list('id', flat=True)[
+                    :2
+                ]
+            )
+        name = Ingredient.objects.using(using).values_list('name', flat=True)
+        try:
+            queries = main_queries(
+                user,
+                author_id.first() or user.id,
+                slug.first() or 'tag',
+                ingredient_ids,
+                (name.first() or 'a')[:2],
+            )
+        except ValidationError as error:
+            raise CommandError(f'Invalid filter parameters: {error}')
+
+        failures = []
+        with transaction.atomic(using=using):
+            if connection.vendor == 'postgresql':
+                # На маленьких таблицах полный просмотр дешевле индекса.
+                # С запретом полного просмотра план совпадает с планом
+                # на больших данных, и Seq Scan означает, что подходящего
+                # индекса нет.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for title, queryset in queries:
+                plan = queryset.using(using).explain()
+                if options['show']:
+                    self.stdout.write(f'{title}\n{plan}\n')
+                # Проверяются все таблицы плана: подзапросы флагов
+                # пользователя и соединения фильтров тоже должны идти
+                # по индексам.
+                for table in sorted(set(pattern.findall(plan))):
+                    failures.append(f'{title}: sequential scan on {table}')
+
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(
+            self.style.SUCCESS(f'All {len(queries)} queries use indexes')
+        )
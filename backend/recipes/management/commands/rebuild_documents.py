@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import constants
+from api.documents import rebuild_documents
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized recipe documents in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=constants.DOCUMENT_BATCH_SIZE,
+            help='Number of recipes rebuilt per transaction',
+        )
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Only rebuild recipes without a document',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipes = Recipe.objects.order_by('id')
+        if options['missing']:
+            recipes = recipes.filter(document__isnull=True)
+
+        rebuilt = 0
+        last_id = 0
+        while True:
+            recipe_ids = list(
+                recipes.filter(id__gt=last_id).values_list('id', flat=True)[
+                    :batch_size
+                ]
+            )
+            if not recipe_ids:
+                break
+            with transaction.atomic():
+                rebuilt += rebuild_documents(recipe_ids, batch_size)
+            last_id = recipe_ids[-1]
+            self.stdout.write(f'Rebuilt {rebuilt} documents')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt {rebuilt} documents')
+        )
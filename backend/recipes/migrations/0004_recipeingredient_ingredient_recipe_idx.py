@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-19 10:23
+
+from django.db import migrations, models
+
+from foodgram.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции.
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0003_recipe_ingredients_minhash'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipeingredient',
+            index=models.Index(
+                fields=['ingredient', 'recipe'], name='ingredient_recipe_idx'
+            ),
+        ),
+    ]
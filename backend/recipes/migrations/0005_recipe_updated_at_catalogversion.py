@@ -0,0 +1,42 @@
+# Generated by Django 3.2.3 on 2026-10-19 14:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_catalog_versions(apps, schema_editor):
+    CatalogVersion = apps.get_model('recipes', 'CatalogVersion')
+    for name in ('tags', 'ingredients'):
+        CatalogVersion.objects.get_or_create(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipeingredient_ingredient_recipe_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32, unique=True, verbose_name='Справочник')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Версия')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Версия справочника',
+                'verbose_name_plural': 'Версии справочников',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(
+            create_catalog_versions, migrations.RunPython.noop
+        ),
+    ]
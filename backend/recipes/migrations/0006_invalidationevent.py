@@ -0,0 +1,26 @@
+# Generated by Django 3.2.3 on 2026-10-19 10:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_updated_at_catalogversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvalidationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sender', models.CharField(max_length=128, verbose_name='Процесс')),
+                ('payload', models.TextField(verbose_name='Событие')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Событие сброса кеша',
+                'verbose_name_plural': 'События сброса кеша',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-19 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_invalidationevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='document',
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name='Представление рецепта'),
+        ),
+    ]
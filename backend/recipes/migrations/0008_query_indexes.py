@@ -0,0 +1,51 @@
+from django.db import migrations, models
+
+from foodgram.operations import AddIndexConcurrently, CreateIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции.
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0007_recipe_document'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(
+                fields=['-pub_date'], name='recipe_pub_date_idx'
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx',
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='favoriterecipe',
+            index=models.Index(
+                fields=['recipe', 'user'], name='favorite_recipe_user_idx'
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='subscribe',
+            index=models.Index(
+                fields=['author', 'user'], name='subscribe_author_user_idx'
+            ),
+        ),
+        CreateIndexConcurrently(
+            name='cart_recipe_cart_idx',
+            table='recipes_shoppingcart_recipe',
+            columns='"recipe_id", "shoppingcart_id"',
+        ),
+        CreateIndexConcurrently(
+            name='ingredient_name_prefix_idx',
+            table='recipes_ingredient',
+            columns='UPPER("name"::text) text_pattern_ops',
+            sqlite_columns='"name" COLLATE NOCASE',
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def backfill_ingredients_minhash(apps, schema_editor):
+    from recipes.indexes.similarity import minhash
+
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    recipes = Recipe.objects.filter(ingredients_minhash__isnull=True)
+    last_id = 0
+    while True:
+        recipe_ids = list(
+            recipes.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:BATCH_SIZE]
+        )
+        if not recipe_ids:
+            break
+        ingredients = {recipe_id: set() for recipe_id in recipe_ids}
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in rows:
+            ingredients[recipe_id].add(ingredient_id)
+        Recipe.objects.bulk_update(
+            [
+                Recipe(id=recipe_id, ingredients_minhash=minhash(ids))
+                for recipe_id, ids in ingredients.items()
+            ],
+            ['ingredients_minhash'],
+        )
+        last_id = recipe_ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_ingredients_minhash, migrations.RunPython.noop
+        ),
+    ]
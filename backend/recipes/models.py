@@ -53,6 +53,41 @@ class Ingredient(models.Model):
         return f'{self.name}, {self.measurement_unit}.'
 
 
+class CatalogVersion(models.Model):
+    """Версия справочника (тегов, ингредиентов) для условных запросов."""
+
+    name = models.CharField('Справочник', max_length=32, unique=True)
+    version = models.PositiveIntegerField('Версия', default=0)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+
+class InvalidationEvent(models.Model):
+    """
+    Событие шины сброса кешей для транспорта database: воркеры опрашивают
+    таблицу и применяют новые события других процессов.
+    """
+
+    sender = models.CharField('Процесс', max_length=128)
+    payload = models.TextField('Событие')
+    created_at = models.DateTimeField(
+        'Дата создания', auto_now_add=True, db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Событие сброса кеша'
+        verbose_name_plural = 'События сброса кеша'
+
+    def __str__(self):
+        return self.payload
+
+
 class Recipe(models.Model):
     """Модель для рецептов."""
 
@@ -91,11 +126,31 @@ class Recipe(models.Model):
         Tag, verbose_name='Тэги', related_name='recipes'
     )
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    ingredients_minhash = models.JSONField(
+        'MinHash-сигнатура ингредиентов',
+        null=True,
+        blank=True,
+        editable=False,
+    )
+    document = models.JSONField(
+        'Представление рецепта',
+        null=True,
+        blank=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.author.email}, {self.name}'
@@ -134,6 +189,11 @@ class RecipeIngredient(models.Model):
                 fields=['recipe', 'ingredient'], name='unique ingredient'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['ingredient', 'recipe'], name='ingredient_recipe_idx'
+            )
+        ]
 
     def __str__(self):
         return f'{self.recipe.name} - {self.ingredient.name}: {self.amount}'
@@ -165,6 +225,11 @@ class Subscribe(models.Model):
                 fields=['user', 'author'], name='unique_subscription'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='subscribe_author_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'Пользователь {self.user} -> автор {self.author}'
@@ -195,6 +260,11 @@ class FavoriteRecipe(models.Model):
                 fields=['user', 'recipe'], name='unique_favorite_recipe'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='favorite_recipe_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} добавил {self.recipe} в избранное'
@@ -0,0 +1,315 @@
+import threading
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from foodgram.cache import bump_generation, lists_namespace
+from .indexes import (
+    ingredient_index,
+    recent_index,
+    similarity_index,
+    tag_index,
+)
+from .models import (
+    FavoriteRecipe,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from .versions import (
+    AUTHOR_FIELDS,
+    CATALOG_INGREDIENTS,
+    CATALOG_TAGS,
+    bump_catalog_version,
+    touch_recipes,
+)
+
+User = get_user_model()
+
+_pending = threading.local()
+
+
+class PendingChanges:
+    """Изменения индексов в памяти, отложенные до фиксации транзакции."""
+
+    __slots__ = ('updates', 'similarity', 'touched', 'generations')
+
+    def __init__(self):
+        self.updates = []
+        self.similarity = set()
+        self.touched = set()
+        self.generations = set()
+
+
+def apply_pending():
+    """
+    Применяет изменения, накопленные в транзакции: изменения индексов
+    в порядке сигналов, пересчет сигнатур по обновленному индексу
+    ингредиентов, затем по одному разу отметку изменения рецептов
+    и смену поколений кеша.
+    """
+    pending = getattr(_pending, 'changes', None)
+    _pending.changes = None
+    if pending is None:
+        return
+    for update in pending.updates:
+        update()
+    for recipe_id in pending.similarity:
+        similarity_index.refresh_recipe(recipe_id)
+    if pending.touched:
+        touch_recipes(pending.touched)
+    for namespace in pending.generations:
+        bump_generation(namespace)
+
+
+def get_pending(using):
+    """Изменения индексов текущей транзакции соединения using."""
+    pending = getattr(_pending, 'changes', None)
+    # После отката транзакции отложенное применение отменяется, а
+    # накопленные изменения не должны переходить в следующую транзакцию.
+    scheduled = pending is not None and any(
+        entry[1] is apply_pending
+        for entry in connections[using].run_on_commit
+    )
+    if not scheduled:
+        pending = _pending.changes = PendingChanges()
+        transaction.on_commit(apply_pending, using=using)
+    return pending
+
+
+def defer_index_update(update, using=DEFAULT_DB_ALIAS):
+    """
+    Откладывает изменение индекса в памяти до фиксации транзакции: после
+    отката в индексе не остается рецептов, которых нет в базе.
+    """
+    if not connections[using].in_atomic_block:
+        update()
+        return
+    get_pending(using).updates.append(update)
+
+
+def schedule_similarity_refresh(recipe_id, using=DEFAULT_DB_ALIAS):
+    """
+    Откладывает пересчет MinHash-сигнатуры рецепта до конца транзакции,
+    чтобы при сохранении всех ингредиентов рецепта он выполнился один раз.
+    """
+    if not connections[using].in_atomic_block:
+        similarity_index.refresh_recipe(recipe_id)
+        return
+    get_pending(using).similarity.add(recipe_id)
+
+
+def schedule_touch(recipe_ids, using=DEFAULT_DB_ALIAS):
+    """
+    Откладывает отметку изменения рецептов до фиксации транзакции:
+    ингредиенты рецепта сохраняются по одному, а дата изменения
+    обновляется одним запросом.
+    """
+    if not connections[using].in_atomic_block:
+        touch_recipes(recipe_ids)
+        return
+    get_pending(using).touched.update(recipe_ids)
+
+
+def schedule_generation_bump(namespace, using=DEFAULT_DB_ALIAS):
+    """
+    Откладывает смену поколения кеша до фиксации транзакции. Поколение
+    меняется один раз, и до фиксации другие запросы не успевают
+    закешировать под новым поколением старые данные.
+    """
+    if not connections[using].in_atomic_block:
+        bump_generation(namespace)
+        return
+    get_pending(using).generations.add(namespace)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def index_recipe_ingredient(sender, instance, created, using, **kwargs):
+    """Добавляет ингредиент рецепта в индексы."""
+    if created:
+        update = partial(
+            ingredient_index.add, instance.recipe_id, instance.ingredient_id
+        )
+    else:
+        update = partial(ingredient_index.refresh_recipe, instance.recipe_id)
+    defer_index_update(update, using)
+    schedule_similarity_refresh(instance.recipe_id, using)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def unindex_recipe_ingredient(sender, instance, using, **kwargs):
+    """Удаляет ингредиент рецепта из индексов."""
+    update = partial(
+        ingredient_index.discard, instance.recipe_id, instance.ingredient_id
+    )
+    defer_index_update(update, using)
+    schedule_similarity_refresh(instance.recipe_id, using)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def index_recipe_tags(
+    sender, instance, action, reverse, pk_set, using, **kwargs
+):
+    """Обновляет битовые карты тегов при изменении тегов рецепта."""
+    if action.startswith('post_'):
+        defer_index_update(recent_index.clear_tags, using)
+    if action == 'post_clear':
+        if reverse:
+            defer_index_update(tag_index.reset, using)
+        else:
+            defer_index_update(
+                partial(tag_index.discard_recipe, instance.id), using
+            )
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+    update = tag_index.add if action == 'post_add' else tag_index.remove
+    if reverse:
+        for recipe_id in pk_set:
+            defer_index_update(
+                partial(update, recipe_id, [instance.id]), using
+            )
+    else:
+        defer_index_update(partial(update, instance.id, set(pk_set)), using)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def reset_tag_index(sender, using, **kwargs):
+    """Перестраивает битовые карты при изменении справочника тегов."""
+    defer_index_update(tag_index.reset, using)
+    defer_index_update(recent_index.clear_tags, using)
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, using, **kwargs):
+    """Удаляет рецепт из индексов."""
+    defer_index_update(
+        partial(similarity_index.discard_recipe, instance.id), using
+    )
+    defer_index_update(partial(tag_index.discard_recipe, instance.id), using)
+    defer_index_update(
+        partial(recent_index.discard_recipe, instance.id), using
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, created, using, **kwargs):
+    """Добавляет новый рецепт в индекс последних рецептов."""
+    if created:
+        defer_index_update(
+            partial(recent_index.add, instance.id, instance.pub_date), using
+        )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_recipes_generation(sender, using, **kwargs):
+    """
+    Делает устаревшими закешированные выборки рецептов при изменении
+    каталога. Избранное и покупки меняют только поколение списков
+    пользователя.
+    """
+    if kwargs.get('action', 'post_').startswith('post_'):
+        schedule_generation_bump('recipes', using)
+
+
+@receiver(m2m_changed, sender=ShoppingCart.recipe.through)
+def remember_cart_users(sender, instance, action, reverse, **kwargs):
+    """Запоминает владельцев корзин с рецептом до очистки его связей."""
+    if reverse and action == 'pre_clear':
+        instance._cart_user_ids = list(
+            instance.shopping_cart.values_list('user_id', flat=True)
+        )
+
+
+def cart_user_ids(instance, action, reverse, pk_set):
+    """Пользователи, чей список покупок изменило действие m2m_changed."""
+    if not action.startswith('post_'):
+        return []
+    if not reverse:
+        user_ids = [instance.user_id]
+    elif action == 'post_clear':
+        user_ids = getattr(instance, '_cart_user_ids', [])
+    else:
+        user_ids = ShoppingCart.objects.filter(id__in=pk_set).values_list(
+            'user_id', flat=True
+        )
+    return [user_id for user_id in user_ids if user_id is not None]
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+def bump_favorites_generation(sender, instance, **kwargs):
+    """Делает устаревшими закешированные выборки по избранному."""
+    bump_generation(lists_namespace(instance.user_id))
+
+
+@receiver(m2m_changed, sender=ShoppingCart.recipe.through)
+def bump_cart_generation(sender, instance, action, reverse, pk_set, **kwargs):
+    """Делает устаревшими закешированные выборки по списку покупок."""
+    for user_id in cart_user_ids(instance, action, reverse, pk_set):
+        bump_generation(lists_namespace(user_id))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def touch_recipe_ingredients(sender, instance, using, **kwargs):
+    """Отмечает изменение рецепта при изменении его ингредиентов."""
+    schedule_touch([instance.recipe_id], using)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_recipe_tags(
+    sender, instance, action, reverse, pk_set, using, **kwargs
+):
+    """Отмечает изменение рецептов при изменении их тегов."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            schedule_touch([instance.id], using)
+    elif action in ('post_add', 'post_remove'):
+        schedule_touch(pk_set, using)
+    elif action == 'pre_clear':
+        schedule_touch(instance.recipes.values_list('id', flat=True), using)
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(
+    sender, instance, created, update_fields, **kwargs
+):
+    """Отмечает изменение рецептов автора при изменении его профиля."""
+    if created:
+        return
+    if update_fields is None or AUTHOR_FIELDS.intersection(
+        update_fields
+    ):
+        touch_recipes(instance.recipe.values_list('id', flat=True))
+        bump_generation('recipes')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    """Увеличивает версию справочника тегов и его кеша."""
+    bump_catalog_version(CATALOG_TAGS)
+    bump_generation('tags')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    """Увеличивает версию справочника ингредиентов и его кеша."""
+    bump_catalog_version(CATALOG_INGREDIENTS)
+    bump_generation('ingredients')
@@ -0,0 +1,47 @@
+"""Отметки изменений рецептов и версии справочников."""
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CatalogVersion, Recipe
+
+# Справочники с версиями для условных запросов
+CATALOG_TAGS = 'tags'
+CATALOG_INGREDIENTS = 'ingredients'
+CATALOGS = (CATALOG_TAGS, CATALOG_INGREDIENTS)
+# Поля пользователя, которые выводятся в рецептах как данные автора
+AUTHOR_FIELDS = frozenset(
+    ('email', 'username', 'first_name', 'last_name', 'avatar')
+)
+
+
+def bump_catalog_version(name):
+    """Увеличивает версию справочника."""
+    updated = CatalogVersion.objects.filter(name=name).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        CatalogVersion.objects.get_or_create(
+            name=name, defaults={'version': 1}
+        )
+
+
+def get_catalog_versions(*names):
+    """
+    Версии справочников: {имя: (версия, дата изменения)}. Для
+    отсутствующих справочников — (0, None).
+    """
+    versions = dict.fromkeys(names, (0, None))
+    rows = CatalogVersion.objects.filter(name__in=names).values_list(
+        'name', 'version', 'updated_at'
+    )
+    for name, version, updated_at in rows:
+        versions[name] = (version, updated_at)
+    return versions
+
+
+def touch_recipes(recipe_ids):
+    """Обновляет дату изменения рецептов, не вызывая save()."""
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        updated_at=timezone.now()
+    )